@@ -0,0 +1,77 @@
+import asyncio
+import sys
+import time
+from uuid import UUID
+
+import polars as pl
+
+from routing.core.config import settings
+from routing.core.street_network.street_network_util import StreetNetworkUtil
+from routing.db.session import async_session
+from routing.schemas.catchment_area import SEGMENT_TEXT_SCHEMA
+
+
+def fetch_edge_cells_json(
+    edge_layer_id: UUID, edge_table: str, h3_3_cells: list[int]
+) -> int:
+    """Fetch edge data per H3_3 cell with coordinates as JSON text, as done previously."""
+
+    num_rows = 0
+    for h3_short in h3_3_cells:
+        edge_df = pl.read_database_uri(
+            query=f"""
+                SELECT
+                    edge_id AS id, length_m, length_3857, class_, impedance_slope, impedance_slope_reverse,
+                    impedance_surface, CAST(coordinates_3857 AS TEXT) AS coordinates_3857, maxspeed_forward,
+                    maxspeed_backward, source, target, h3_3, h3_6
+                FROM {edge_table}
+                WHERE h3_3 = {h3_short}
+                AND layer_id = '{edge_layer_id}'
+            """,
+            uri=settings.POSTGRES_DATABASE_URI,
+            schema_overrides=SEGMENT_TEXT_SCHEMA,
+        )
+        edge_df = edge_df.with_columns(pl.col("coordinates_3857").str.json_decode())
+        num_rows += edge_df.height
+    return num_rows
+
+
+async def benchmark(num_cells: int) -> None:
+    """Compare cold-load throughput of the JSON text and bulk Arrow extraction paths."""
+
+    if settings.BASE_STREET_NETWORK is None:
+        raise ValueError("No base street network is configured.")
+    edge_layer_id = UUID(settings.BASE_STREET_NETWORK)
+    async with async_session() as db_connection:
+        street_network_util = StreetNetworkUtil(db_connection)
+        h3_3_cells = await street_network_util._get_street_network_region_h3_3_cells(
+            settings.NETWORK_REGION_TABLE
+        )
+        edge_table, _ = await street_network_util._get_street_network_tables(
+            edge_layer_id, None
+        )
+    if edge_table is None:
+        raise ValueError(f"Could not fetch edge table for layer ID {edge_layer_id}.")
+    h3_3_cells = h3_3_cells[:num_cells]
+
+    start_time = time.time()
+    num_rows = fetch_edge_cells_json(edge_layer_id, edge_table, h3_3_cells)
+    duration = time.time() - start_time
+    print(
+        f"JSON text extraction: {num_rows} rows in {round(duration, 2)} sec, {round(num_rows / duration)} rows/sec"
+    )
+
+    start_time = time.time()
+    edge_dfs = street_network_util.fetch_edge_cells(
+        edge_layer_id, edge_table, h3_3_cells
+    )
+    num_rows = sum(edge_df.height for edge_df in edge_dfs.values())
+    duration = time.time() - start_time
+    print(
+        f"Bulk Arrow extraction: {num_rows} rows in {round(duration, 2)} sec, {round(num_rows / duration)} rows/sec"
+    )
+
+
+if __name__ == "__main__":
+    num_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    asyncio.run(benchmark(num_cells))
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from uuid import UUID
+
+from tqdm import tqdm
+
+from routing.core.config import settings
+from routing.core.street_network.street_network_cache import StreetNetworkCache
+from routing.core.street_network.street_network_util import StreetNetworkUtil
+from routing.core.street_network.street_network_variant import (
+    VALID_SEGMENT_CLASSES,
+    build_network_variant,
+)
+from routing.db.session import async_session
+from routing.schemas.catchment_area import SEGMENT_DATA_SCHEMA
+
+
+def validate_edge_cell(
+    street_network_cache: StreetNetworkCache,
+    edge_layer_id: UUID,
+    h3_short: int,
+) -> int:
+    """Validate a cached H3_3 cell by reading it back, returns its number of edges."""
+
+    version = street_network_cache.read_edge_cache_version(edge_layer_id, h3_short)
+    if version is None:
+        raise ValueError(f"Cache of H3_3 cell {h3_short} has no data version.")
+
+    edge_df = street_network_cache.read_edge_cache(edge_layer_id, h3_short)
+
+    missing_columns = set(SEGMENT_DATA_SCHEMA.keys()) - set(edge_df.columns)
+    if missing_columns:
+        raise ValueError(
+            f"Cache of H3_3 cell {h3_short} is missing columns {sorted(missing_columns)}."
+        )
+
+    # The data version starts with the number of edges in the cell
+    num_edges = int(version.split("-")[0])
+    if edge_df.height != num_edges:
+        raise ValueError(
+            f"Cache of H3_3 cell {h3_short} contains {edge_df.height} edges, expected {num_edges}."
+        )
+
+    if not edge_df.get_column("h3_6").is_sorted():
+        raise ValueError(f"Cache of H3_3 cell {h3_short} is not sorted by H3_6 cell.")
+
+    return edge_df.height
+
+
+def build_edge_cells(
+    street_network_util: StreetNetworkUtil,
+    street_network_cache: StreetNetworkCache,
+    edge_layer_id: UUID,
+    edge_table: str,
+    h3_3_cells: list[int],
+    modes: list[str],
+) -> int:
+    """Build, validate and derive network variants for a batch of H3_3 cells,
+    returns the number of edges built."""
+
+    # Fetch all uncached cells of the batch in one bulk query
+    street_network_util.prefetch_edge_cells(
+        street_network_cache, edge_layer_id, edge_table, h3_3_cells
+    )
+
+    num_edges = 0
+    for h3_short in h3_3_cells:
+        num_edges += validate_edge_cell(street_network_cache, edge_layer_id, h3_short)
+
+        with street_network_cache.lock_cell(edge_layer_id, h3_short, "edge"):
+            version = street_network_cache.read_edge_cache_version(
+                edge_layer_id, h3_short
+            )
+            edge_df = None
+            for mode in modes:
+                # Skip network variants which are up to date with the cell
+                if (
+                    street_network_cache.read_edge_cache_version(
+                        edge_layer_id, h3_short, mode
+                    )
+                    == version
+                ):
+                    continue
+                if edge_df is None:
+                    edge_df = street_network_cache.read_edge_cache(
+                        edge_layer_id, h3_short
+                    )
+                street_network_cache.write_edge_cache(
+                    edge_layer_id,
+                    h3_short,
+                    build_network_variant(edge_df, mode),
+                    version,
+                    mode,
+                )
+
+    return num_edges
+
+
+async def build_cache(
+    edge_layer_id: UUID,
+    region_geofence_table: str,
+    modes: list[str],
+    batch_size: int,
+    num_workers: int,
+    refresh: bool,
+) -> bool:
+    """Build and validate street network cache files of an edge layer for a region."""
+
+    async with async_session() as db_connection:
+        street_network_util = StreetNetworkUtil(db_connection)
+        h3_3_cells = await street_network_util._get_street_network_region_h3_3_cells(
+            region_geofence_table
+        )
+        edge_table, _ = await street_network_util._get_street_network_tables(
+            edge_layer_id, None
+        )
+    if edge_table is None:
+        raise ValueError(f"Could not fetch edge table for layer ID {edge_layer_id}.")
+
+    street_network_cache = StreetNetworkCache()
+
+    start_time = time.time()
+
+    # Re-fetch cached cells which changed in the database
+    if refresh:
+        refreshed_cells = street_network_util.refresh_edge_cells(
+            street_network_cache, edge_layer_id, edge_table, h3_3_cells
+        )
+        print(f"Refreshed {len(refreshed_cells)} outdated H3_3 cells.")
+
+    batches = [
+        h3_3_cells[i : i + batch_size] for i in range(0, len(h3_3_cells), batch_size)
+    ]
+
+    num_edges = 0
+    failed_cells = []
+    with (
+        ThreadPoolExecutor(max_workers=num_workers) as executor,
+        tqdm(
+            total=len(h3_3_cells), unit="cell", desc="Building street network cache"
+        ) as progress,
+    ):
+        futures = {
+            executor.submit(
+                build_edge_cells,
+                street_network_util,
+                street_network_cache,
+                edge_layer_id,
+                edge_table,
+                batch,
+                modes,
+            ): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                num_edges += future.result()
+            except Exception as e:
+                failed_cells.extend(batch)
+                tqdm.write(f"Failed to build H3_3 cells {batch}, error: {e}")
+            progress.update(len(batch))
+            progress.set_postfix(
+                edges_per_sec=round(num_edges / max(time.time() - start_time, 1e-6))
+            )
+
+    duration = time.time() - start_time
+    print(
+        f"Built {len(h3_3_cells) - len(failed_cells)} of {len(h3_3_cells)} H3_3 cells "
+        f"with {num_edges} edges in {round(duration / 60, 1)} min "
+        f"({round(num_edges / max(duration, 1e-6))} edges/sec)."
+    )
+    # Graphs are built per request from the extracted sub-network, so network variants
+    # are the last derived artefact which can be built ahead of time
+    print(f"Network variants built for modes: {', '.join(modes) or 'none'}.")
+
+    return len(failed_cells) == 0
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Build and validate the street network cache ahead of time."
+    )
+    parser.add_argument(
+        "--edge-layer-id",
+        type=UUID,
+        default=settings.BASE_STREET_NETWORK,
+        help="Edge layer of the street network, defaults to the base street network.",
+    )
+    parser.add_argument(
+        "--region-table",
+        default=settings.NETWORK_REGION_TABLE,
+        help="Geofence table of the region to build the cache for.",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="*",
+        choices=list(VALID_SEGMENT_CLASSES.keys()),
+        default=list(VALID_SEGMENT_CLASSES.keys()),
+        help="Routing modes to build network variants for.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=8,
+        help="Number of H3_3 cells fetched per bulk query.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.STREET_NETWORK_FETCH_WORKERS,
+        help="Number of batches built in parallel.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Re-fetch cached cells whose data changed in the database.",
+    )
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    success = asyncio.run(
+        build_cache(
+            edge_layer_id=args.edge_layer_id,
+            region_geofence_table=args.region_table,
+            modes=args.modes,
+            batch_size=args.batch_size,
+            num_workers=args.workers,
+            refresh=args.refresh,
+        )
+    )
+    sys.exit(0 if success else 1)
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import PostgresDsn, model_validator
 from pydantic_settings import BaseSettings
 from typing_extensions import Self
@@ -23,11 +25,44 @@ class Settings(BaseSettings):
     API_V2_STR: str = "/api/v2"
     PROJECT_NAME: str = "GOAT Routing API"
     CACHE_DIR: str = "/tmp/cache"
+    # Street network cache files are either Parquet (compact) or uncompressed
+    # Arrow IPC (memory-mapped by workers, pages are shared between processes)
+    STREET_NETWORK_CACHE_FORMAT: Literal["parquet", "ipc"] = "parquet"
+    # Edge cache files are sorted by H3_6 cell and class, Parquet files are written in
+    # row groups of this size with statistics to allow skipping irrelevant row groups
+    STREET_NETWORK_CACHE_ROW_GROUP_SIZE: int = 4096
+    # If enabled, cells are scanned lazily from cache files instead of being held in memory
+    STREET_NETWORK_LAZY_SCAN: bool = False
+    # Maximum number of H3_3 cells fetched from the database or cache concurrently
+    STREET_NETWORK_FETCH_WORKERS: int = 8
+    # Street network H3_3 cells are loaded on demand by workers, least recently used
+    # cells are evicted once their in-memory size exceeds this budget
+    STREET_NETWORK_MEMORY_BUDGET_GB: float = 8.0
+    # Loaded cells are checked against the version of their cache file at most once per
+    # interval, refreshes by other processes are picked up within this delay
+    STREET_NETWORK_VERSION_CHECK_INTERVAL: float = 30.0  # s
+    # Directory on a shared memory filesystem (e.g. /dev/shm/street_network), if set, cells are
+    # published there once per host and memory-mapped read-only by all worker processes
+    STREET_NETWORK_SHARED_MEMORY_DIR: str | None = None
+    # Prefix of Redis hashes which per-cell load metrics and resident street network size
+    # per worker process are published to
+    STREET_NETWORK_METRICS_KEY: str = "street_network_metrics"
+    # Number of scenario network modification sets held in memory per worker process,
+    # they are also cached on disk per scenario version
+    SCENARIO_MODIFICATIONS_CACHE_SIZE: int = 16
+    # Number of H3_10 cells of origin grid disks held in memory per worker process, ~24 bytes
+    # per cell, grid disks of car catchment areas may hold over a million cells
+    H3_10_GRID_CACHE_CELLS: int = 5000000
 
     NETWORK_REGION_TABLE: str = "basic.geofence_active_mobility"
 
     CATCHMENT_AREA_CAR_BUFFER_DEFAULT_SPEED: int = 80  # km/h
     CATCHMENT_AREA_HOLE_THRESHOLD_SQM: int = 200000  # 20 hectares, ~450m x 450m
+    # Origin points further than this from the street network are disconnected
+    CATCHMENT_AREA_SNAP_DISTANCE: int = 500  # m
+    # If true, the cost of a H3_10 grid cell is the minimum cost of the network within it,
+    # otherwise it's interpolated from the network node nearest to its centroid (default)
+    CATCHMENT_AREA_H3_GRID_AGGREGATION: bool = False
 
     BASE_STREET_NETWORK: str | None = "903ecdca-b717-48db-bbce-0219e41439cf"
     DEFAULT_STREET_NETWORK_NODE_LAYER_PROJECT_ID: int = (
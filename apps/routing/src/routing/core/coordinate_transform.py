@@ -0,0 +1,193 @@
+"""
+Vectorized conversions between pixel, Web Mercator and WGS84 coordinates.
+
+All conversions are Numba ufuncs, they accept scalars as well as arrays of any
+shape and can be called from other jitted functions.
+"""
+
+import math
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from numba import njit, vectorize
+
+EARTH_CIRCUMFERENCE = 40075016.68557849  # meters, at the equator
+EARTH_RADIUS = 6378137.0  # meters
+
+
+@njit(cache=True)  # type: ignore
+def z_scale(z: int) -> int:
+    """
+    2^z represents the tile number. Scale that by the number of pixels in each tile.
+    """
+    _2z: int = 2**z
+    pixels_per_tile = 256
+    return _2z * pixels_per_tile
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def longitude_to_pixel_x(longitude: float, zoom: int) -> float:
+    """
+    Convert longitude to pixel x coordinate
+    """
+    scale: int = z_scale(zoom)
+    return ((longitude + 180) / 360) * scale
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def latitude_to_pixel_y(latitude: float, zoom: int) -> float:
+    """
+    Convert latitude to pixel y coordinate
+    """
+    scale: int = z_scale(zoom)
+    lat_rad = (latitude * math.pi) / 180
+    return (
+        (1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2
+    ) * scale
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def web_mercator_x_to_pixel_x(x: float, zoom: int) -> float:
+    """
+    Convert web mercator x coordinate to pixel x coordinate
+    """
+    scale: int = z_scale(zoom)
+    return (x + (EARTH_CIRCUMFERENCE / 2.0)) / (EARTH_CIRCUMFERENCE / scale)
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def web_mercator_y_to_pixel_y(y: float, zoom: int) -> float:
+    """
+    Convert web mercator y coordinate to pixel y coordinate
+    """
+    scale: int = z_scale(zoom)
+    return (y - (EARTH_CIRCUMFERENCE / 2.0)) / (EARTH_CIRCUMFERENCE / (-1 * scale))
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def pixel_x_to_longitude(pixel_x: float, zoom: int) -> float:
+    """
+    Convert pixel x coordinate to longitude
+    """
+    scale: int = z_scale(zoom)
+    return (pixel_x / scale) * 360 - 180
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def pixel_y_to_latitude(pixel_y: float, zoom: int) -> float:
+    """
+    Convert pixel y coordinate to latitude
+    """
+    scale: int = z_scale(zoom)
+    lat_rad = math.atan(math.sinh(math.pi * (1 - (2 * pixel_y) / scale)))
+    return lat_rad * 180 / math.pi
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def pixel_x_to_web_mercator_x(pixel_x: float, zoom: int) -> float:
+    """
+    Convert pixel x coordinate to web mercator x coordinate
+    """
+    scale: int = z_scale(zoom)
+    return pixel_x * (EARTH_CIRCUMFERENCE / scale) - (EARTH_CIRCUMFERENCE / 2.0)
+
+
+@vectorize(["float64(float64, int64)"], cache=True)  # type: ignore
+def pixel_y_to_web_mercator_y(pixel_y: float, zoom: int) -> float:
+    """
+    Convert pixel y coordinate to web mercator y coordinate
+    """
+    scale: int = z_scale(zoom)
+    return pixel_y * (EARTH_CIRCUMFERENCE / (-1 * scale)) + (EARTH_CIRCUMFERENCE / 2.0)
+
+
+@vectorize(["float64(float64)"], cache=True)  # type: ignore
+def web_mercator_x_to_longitude(x: float) -> float:
+    """
+    Convert web mercator x coordinate to longitude
+    """
+    return (x / EARTH_RADIUS) * 180 / math.pi
+
+
+@vectorize(["float64(float64)"], cache=True)  # type: ignore
+def web_mercator_y_to_latitude(y: float) -> float:
+    """
+    Convert web mercator y coordinate to latitude
+    """
+    return math.atan(math.sinh(y / EARTH_RADIUS)) * 180 / math.pi
+
+
+@vectorize(["float64(float64)"], cache=True)  # type: ignore
+def longitude_to_web_mercator_x(longitude: float) -> float:
+    """
+    Convert longitude to web mercator x coordinate
+    """
+    return (longitude * math.pi / 180) * EARTH_RADIUS
+
+
+@vectorize(["float64(float64)"], cache=True)  # type: ignore
+def latitude_to_web_mercator_y(latitude: float) -> float:
+    """
+    Convert latitude to web mercator y coordinate
+    """
+    lat_rad = (latitude * math.pi) / 180
+    return math.log(math.tan(math.pi / 4 + lat_rad / 2)) * EARTH_RADIUS
+
+
+def coordinates_to_pixels(
+    coordinates: npt.NDArray[Any], zoom: int, web_mercator: bool = False
+) -> npt.NDArray[np.double]:
+    """
+    Convert an (n, 2) array of longitude / latitude or web mercator coordinates
+    to pixel coordinates
+    """
+    coordinates = np.asarray(coordinates, dtype=np.double)
+    pixels = np.empty_like(coordinates)
+    if web_mercator:
+        web_mercator_x_to_pixel_x(coordinates[..., 0], zoom, out=pixels[..., 0])
+        web_mercator_y_to_pixel_y(coordinates[..., 1], zoom, out=pixels[..., 1])
+    else:
+        longitude_to_pixel_x(coordinates[..., 0], zoom, out=pixels[..., 0])
+        latitude_to_pixel_y(coordinates[..., 1], zoom, out=pixels[..., 1])
+    return pixels
+
+
+def pixels_to_coordinates(
+    pixels: npt.NDArray[Any], zoom: int, web_mercator: bool = False
+) -> npt.NDArray[np.double]:
+    """
+    Convert an (n, 2) array of pixel coordinates to longitude / latitude or
+    web mercator coordinates
+    """
+    pixels = np.asarray(pixels, dtype=np.double)
+    coordinates = np.empty_like(pixels)
+    if web_mercator:
+        pixel_x_to_web_mercator_x(pixels[..., 0], zoom, out=coordinates[..., 0])
+        pixel_y_to_web_mercator_y(pixels[..., 1], zoom, out=coordinates[..., 1])
+    else:
+        pixel_x_to_longitude(pixels[..., 0], zoom, out=coordinates[..., 0])
+        pixel_y_to_latitude(pixels[..., 1], zoom, out=coordinates[..., 1])
+    return coordinates
+
+
+def web_mercator_to_wgs84(coordinates: npt.NDArray[Any]) -> npt.NDArray[np.double]:
+    """
+    Convert an (n, 2) array of web mercator coordinates to longitude / latitude
+    """
+    coordinates = np.asarray(coordinates, dtype=np.double)
+    result = np.empty_like(coordinates)
+    web_mercator_x_to_longitude(coordinates[..., 0], out=result[..., 0])
+    web_mercator_y_to_latitude(coordinates[..., 1], out=result[..., 1])
+    return result
+
+
+def wgs84_to_web_mercator(coordinates: npt.NDArray[Any]) -> npt.NDArray[np.double]:
+    """
+    Convert an (n, 2) array of longitude / latitude to web mercator coordinates
+    """
+    coordinates = np.asarray(coordinates, dtype=np.double)
+    result = np.empty_like(coordinates)
+    longitude_to_web_mercator_x(coordinates[..., 0], out=result[..., 0])
+    latitude_to_web_mercator_y(coordinates[..., 1], out=result[..., 1])
+    return result
@@ -0,0 +1,222 @@
+"""
+Compute H3 cell coverages of catchment area buffers in-process, rather than querying
+them from PostGIS for every request.
+"""
+
+import math
+from typing import Any
+
+import h3ronpy
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+import pyarrow as pa
+from h3ronpy.vector import cells_to_coordinates, coordinates_to_cells
+from routing.core.coordinate_transform import (
+    web_mercator_to_wgs84,
+    wgs84_to_web_mercator,
+)
+
+EARTH_RADIUS_M = 6371007.180918475
+
+# Average hexagon edge length at resolution 10, as returned by h3_get_hexagon_edge_length_avg
+H3_10_AVERAGE_EDGE_LENGTH_M = 75.863783
+
+
+def to_short_h3_3(h3_index: npt.NDArray[np.uint64]) -> npt.NDArray[np.int32]:
+    """Convert H3_3 indexes to short IDs, equivalent to basic.to_short_h3_3."""
+
+    return ((h3_index & 0x000FFFF000000000) >> 36).astype(np.int32)
+
+
+def to_short_h3_6(h3_index: npt.NDArray[np.uint64]) -> npt.NDArray[np.int32]:
+    """Convert H3_6 indexes to short IDs, equivalent to basic.to_short_h3_6."""
+
+    return ((h3_index & 0x000FFFFFFF000000) >> 24).astype(np.int32)
+
+
+def short_h3_6_to_short_h3_3(h3_6: npt.NDArray[np.int32]) -> npt.NDArray[np.int32]:
+    """Get short IDs of the H3_3 parents of short H3_6 IDs.
+
+    Short IDs hold the base cell followed by the resolution digits, so the parent
+    is obtained by dropping the digits of resolutions 4 to 6.
+    """
+
+    return h3_6 >> 12
+
+
+def haversine_distance(
+    latitude_a: npt.NDArray[Any],
+    longitude_a: npt.NDArray[Any],
+    latitude_b: npt.NDArray[Any],
+    longitude_b: npt.NDArray[Any],
+) -> npt.NDArray[np.double]:
+    """Compute great-circle distances in meters between coordinates in degrees."""
+
+    latitude_a, longitude_a = np.radians(latitude_a), np.radians(longitude_a)
+    latitude_b, longitude_b = np.radians(latitude_b), np.radians(longitude_b)
+    a = (
+        np.sin((latitude_b - latitude_a) / 2) ** 2
+        + np.cos(latitude_a)
+        * np.cos(latitude_b)
+        * np.sin((longitude_b - longitude_a) / 2) ** 2
+    )
+    distance: npt.NDArray[np.double] = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+    return distance
+
+
+def hexagon_edge_length(h3_index: Any) -> npt.NDArray[np.double]:
+    """Get edge lengths in meters of H3 cells, derived from their area."""
+
+    area = pa.array(h3ronpy.cells_area_m2(h3_index)).to_numpy()
+    edge_length: npt.NDArray[np.double] = np.sqrt(2 * area / (3 * math.sqrt(3)))
+    return edge_length
+
+
+def cells_to_centroids(h3_index: Any) -> pl.DataFrame:
+    """Get the centroids of H3 cells as a frame of lat & lng columns."""
+
+    centroids = pl.from_arrow(pa.record_batch(cells_to_coordinates(h3_index)))
+    if not isinstance(centroids, pl.DataFrame):
+        raise TypeError("H3 cell centroids were not converted to a DataFrame.")
+    return centroids
+
+
+def get_h3_6_coverage(
+    latitudes: list[float], longitudes: list[float], buffer_dist: float
+) -> tuple[set[int], set[int]]:
+    """Get short IDs of H3_3 and H3_6 cells intersecting buffers around origin points.
+
+    Grid disks around the origin cells are sized to cover the buffer even for the
+    smallest origin cell, cells which can't intersect the buffer are then dropped.
+    """
+
+    latitude_array: npt.NDArray[np.double] = np.asarray(latitudes, dtype=np.double)
+    longitude_array: npt.NDArray[np.double] = np.asarray(longitudes, dtype=np.double)
+    origin_cells = coordinates_to_cells(latitude_array, longitude_array, 6)
+
+    # A grid disk of radius k covers at least 1.5 * k edge lengths around its center
+    edge_length = hexagon_edge_length(origin_cells).min()
+    radius = math.ceil((buffer_dist + edge_length) / (1.5 * edge_length))
+
+    cells = pl.DataFrame(
+        {
+            "latitude": latitude_array,
+            "longitude": longitude_array,
+            "h3_index": pl.from_arrow(
+                pa.array(h3ronpy.grid_disk(origin_cells, radius))
+            ),
+        }
+    ).explode("h3_index")
+    h3_index = cells.get_column("h3_index").to_arrow()
+    centroids = cells_to_centroids(h3_index)
+
+    # A cell intersects the buffer if its centroid is within the buffer distance plus
+    # its circumradius, which equals its edge length
+    distance = haversine_distance(
+        cells.get_column("latitude").to_numpy(),
+        cells.get_column("longitude").to_numpy(),
+        centroids.get_column("lat").to_numpy(),
+        centroids.get_column("lng").to_numpy(),
+    )
+    h3_6 = np.unique(
+        to_short_h3_6(
+            h3_index.to_numpy()[distance <= buffer_dist + hexagon_edge_length(h3_index)]
+        )
+    )
+
+    return set(short_h3_6_to_short_h3_3(h3_6).tolist()), set(h3_6.tolist())
+
+
+def get_origin_cells(
+    latitudes: list[float], longitudes: list[float]
+) -> tuple[list[str], list[int]]:
+    """Get H3_10 indexes and short H3_3 IDs of the cells containing origin points."""
+
+    latitude_array: npt.NDArray[np.double] = np.asarray(latitudes, dtype=np.double)
+    longitude_array: npt.NDArray[np.double] = np.asarray(longitudes, dtype=np.double)
+
+    h3_10 = coordinates_to_cells(latitude_array, longitude_array, 10)
+    h3_3 = pa.array(h3ronpy.change_resolution(h3_10, 3)).to_numpy()
+    return (
+        pa.array(h3ronpy.cells_to_string(h3_10)).to_pylist(),
+        to_short_h3_3(h3_3).tolist(),
+    )
+
+
+def web_mercator_to_h3_10(coordinates: npt.NDArray[Any]) -> npt.NDArray[np.uint64]:
+    """Get H3_10 cells containing an (n, 2) array of web mercator coordinates."""
+
+    coordinates = web_mercator_to_wgs84(coordinates)
+    cells: npt.NDArray[np.uint64] = pa.array(
+        coordinates_to_cells(
+            np.ascontiguousarray(coordinates[:, 1]),
+            np.ascontiguousarray(coordinates[:, 0]),
+            10,
+        )
+    ).to_numpy()
+    return cells
+
+
+def get_h3_10_grid_radius(buffer_dist: float) -> int:
+    """Get the radius of H3_10 grid disks covering a buffer around their origin cell."""
+
+    # Integer casts in PostgreSQL round, the radius matches the previous SQL query
+    return int(buffer_dist + 0.5) // round(H3_10_AVERAGE_EDGE_LENGTH_M * 1.5)
+
+
+def get_h3_10_grid_disks(
+    origin_h3_10: list[str], radius: int
+) -> list[
+    tuple[npt.NDArray[np.uint64], npt.NDArray[np.double], npt.NDArray[np.double]]
+]:
+    """Get H3_10 cells within grid disks around each origin cell and their web
+    mercator centroids, centroids of all disks are projected in one batch."""
+
+    disks = pa.array(h3ronpy.grid_disk(h3ronpy.cells_parse(origin_h3_10), radius))
+    offsets = disks.offsets.to_numpy()
+    cells = disks.flatten()
+
+    centroids = cells_to_centroids(cells)
+    centroids_3857 = wgs84_to_web_mercator(
+        np.column_stack(
+            (
+                centroids.get_column("lng").to_numpy(),
+                centroids.get_column("lat").to_numpy(),
+            )
+        )
+    )
+
+    cells = cells.to_numpy()
+    return [
+        (
+            cells[start:end],
+            np.ascontiguousarray(centroids_3857[start:end, 0]),
+            np.ascontiguousarray(centroids_3857[start:end, 1]),
+        )
+        for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+
+
+def merge_h3_10_grid_disks(
+    disks: list[
+        tuple[npt.NDArray[np.uint64], npt.NDArray[np.double], npt.NDArray[np.double]]
+    ],
+) -> tuple[
+    npt.NDArray[np.uint64], list[str], npt.NDArray[np.double], npt.NDArray[np.double]
+]:
+    """Merge H3_10 grid disks into a grid of unique cells, sorted by index, their
+    string representation and their web mercator centroids."""
+
+    cells, index = np.unique(
+        np.concatenate([cells for cells, _, _ in disks]), return_index=True
+    )
+    x = np.concatenate([x for _, x, _ in disks])[index]
+    y = np.concatenate([y for _, _, y in disks])[index]
+
+    return (
+        cells,
+        pa.array(h3ronpy.cells_to_string(pa.array(cells))).to_pylist(),
+        x,
+        y,
+    )
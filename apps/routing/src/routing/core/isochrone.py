@@ -8,6 +8,8 @@ import numpy as np
 from numba import njit
 from numba.core import types
 from numba.typed import Dict, List
+from routing.core.coordinate_transform import web_mercator_to_wgs84
+from routing.core.h3_coverage import H3_10_AVERAGE_EDGE_LENGTH_M, web_mercator_to_h3_10
 from routing.utils import (
     coordinate_to_pixel,
     web_mercator_x_to_pixel_x,
@@ -18,7 +20,7 @@ from scipy import spatial
 
 @njit(cache=True)  # type: ignore
 def construct_adjacency_list_(
-    n, edge_source, edge_target, edge_cost, edge_reverse_cost
+    n, edge_source, edge_target, edge_cost, edge_reverse_cost, edge_deleted
 ) -> list[list[list[float]]]:
     """
     Construct adjacency list from edges
@@ -27,10 +29,13 @@ def construct_adjacency_list_(
     :param edge_target: List of edge target nodes
     :param edge_cost: List of edge costs
     :param edge_reverse_cost: List of edge reverse costs
+    :param edge_deleted: Mask of edges removed by a scenario overlay, they are never relaxed
     :return: Adjacency list
     """
     adj_list: list[list[list[float]]] = List([List([List([-1.001, -1.001])])] * n)
     for i in range(len(edge_source)):
+        if edge_deleted[i]:
+            continue
         if edge_cost[i] >= 0.0:
             if adj_list[edge_source[i]][0][0] == -1.001:
                 adj_list[edge_source[i]] = List([List([edge_target[i], edge_cost[i]])])
@@ -49,22 +54,25 @@ def construct_adjacency_list_(
 
 
 @njit(cache=True)
-def dijkstra(start_vertices, adj_list, travel_time, use_distance=False):
+def dijkstra(
+    start_vertices, adj_list, travel_time, use_distance=False, cost_factor=1.0
+):
     """
     Dijkstra's algorithm one-to-all shortest path search
     :param start_vertices: List of start vertices
     :param adj_list: Adjacency list
     :param travel_time: Travel time matrix
+    :param cost_factor: Factor converting edge costs to seconds (or meters)
     :return: List of shortest paths and costs
     """
     n = len(adj_list)
     # distances = [np.Inf for _ in range(n)]
-    distances = np.full(n, np.Inf, np.double)
+    distances = np.full(n, np.inf, np.double)
     # loop over all start vertices
     for start_vertex in start_vertices:
         distances[start_vertex] = 0.0
         # visited = [False for _ in range(n)]
-        visited = np.full(n, False, np.bool8)
+        visited = np.full(n, False, np.bool_)
         # set up priority queue
         pq = [(0.0, start_vertex)]
         while len(pq) > 0:
@@ -80,6 +88,10 @@ def dijkstra(start_vertices, adj_list, travel_time, use_distance=False):
             # check the distance and node and distance
             for v, l in adj_list[u]:
                 v = int(v)
+                # Skip the placeholder entry of nodes without edges
+                if v < 0:
+                    continue
+                l = l * cost_factor
                 l = (
                     (l / 60.0) if not use_distance else l
                 )  # convert cost to minutes if required
@@ -93,12 +105,15 @@ def dijkstra(start_vertices, adj_list, travel_time, use_distance=False):
 
 
 @njit(cache=True)
-def dijkstra_h3(start_vertices, adj_list, travel_time, use_distance=False):
+def dijkstra_h3(
+    start_vertices, adj_list, travel_time, use_distance=False, cost_factor=1.0
+):
     """
     Dijkstra's algorithm one-to-all shortest path search
     :param start_vertices: List of start vertices
     :param adj_list: Adjacency list
     :param travel_time: Travel time matrix
+    :param cost_factor: Factor converting edge costs to seconds (or meters)
     :return: List of shortest paths and costs
     """
     distances_list = []
@@ -107,10 +122,10 @@ def dijkstra_h3(start_vertices, adj_list, travel_time, use_distance=False):
 
     # loop over all start vertices
     for start_vertex in start_vertices:
-        distances = np.full(n, np.Inf, np.double)
+        distances = np.full(n, np.inf, np.double)
         distances[start_vertex] = 0.0
         # visited = [False for _ in range(n)]
-        visited = np.full(n, False, np.bool8)
+        visited = np.full(n, False, np.bool_)
         # set up priority queue
         pq = [(0.0, start_vertex)]
         while len(pq) > 0:
@@ -126,6 +141,10 @@ def dijkstra_h3(start_vertices, adj_list, travel_time, use_distance=False):
             # check the distance and node and distance
             for v, l in adj_list[u]:
                 v = int(v)
+                # Skip the placeholder entry of nodes without edges
+                if v < 0:
+                    continue
+                l = l * cost_factor
                 l = (
                     (l / 60.0) if not use_distance else l
                 )  # convert cost to minutes if required
@@ -139,6 +158,190 @@ def dijkstra_h3(start_vertices, adj_list, travel_time, use_distance=False):
     return distances_list
 
 
+@njit(cache=True)
+def construct_overlay_adjacency_list_(
+    n, edge_source, edge_target, edge_cost, edge_reverse_cost
+):
+    """
+    Construct adjacency list of all edges of a scenario overlay, including edges which
+    are deleted in the base or scenario network. Edges are listed at both of their
+    nodes, a negative cost marks a direction which can't be traversed
+    :param n: Number of nodes
+    :param edge_source: List of edge source nodes
+    :param edge_target: List of edge target nodes
+    :param edge_cost: List of edge costs
+    :param edge_reverse_cost: List of edge reverse costs
+    :return: Adjacency list of [node, cost, edge index] entries
+    """
+    adj_list = List([List([List([-1.001, -1.001, -1.001])])] * n)
+    for i in range(len(edge_source)):
+        if not (edge_cost[i] >= 0.0 or edge_reverse_cost[i] >= 0.0):
+            continue
+        if adj_list[edge_source[i]][0][0] == -1.001:
+            adj_list[edge_source[i]] = List([List([edge_target[i], edge_cost[i], i])])
+        else:
+            adj_list[edge_source[i]].append(List([edge_target[i], edge_cost[i], i]))
+        if adj_list[edge_target[i]][0][0] == -1.001:
+            adj_list[edge_target[i]] = List(
+                [List([edge_source[i], edge_reverse_cost[i], i])]
+            )
+        else:
+            adj_list[edge_target[i]].append(
+                List([edge_source[i], edge_reverse_cost[i], i])
+            )
+    return adj_list
+
+
+@njit(cache=True)
+def dijkstra_tree(
+    start_vertices,
+    adj_list,
+    edge_deleted,
+    travel_time,
+    use_distance=False,
+    cost_factor=1.0,
+):
+    """
+    Dijkstra's algorithm one-to-all shortest path search, keeping the shortest path tree
+    :param start_vertices: List of start vertices
+    :param adj_list: Overlay adjacency list
+    :param edge_deleted: Mask of edges which are not relaxed
+    :param travel_time: Travel time matrix
+    :param cost_factor: Factor converting edge costs to seconds (or meters)
+    :return: Costs and predecessor node & edge of each node
+    """
+    n = len(adj_list)
+    distances = np.full(n, np.inf, np.double)
+    predecessor = np.full(n, -1, np.int64)
+    predecessor_edge = np.full(n, -1, np.int64)
+    visited = np.full(n, False, np.bool_)
+
+    # Searching from all start vertices at once yields the minimum cost over them
+    pq = [(0.0, start_vertices[0])]
+    for start_vertex in start_vertices:
+        distances[start_vertex] = 0.0
+        if start_vertex != start_vertices[0]:
+            heapq.heappush(pq, (0.0, start_vertex))
+    while len(pq) > 0:
+        if pq[0][0] >= travel_time:
+            break
+        _, u = heapq.heappop(pq)
+        if visited[u]:
+            continue
+        visited[u] = True
+        for v, l, e in adj_list[u]:
+            v = int(v)
+            e = int(e)
+            if e < 0 or not l >= 0.0 or edge_deleted[e]:
+                continue
+            l = l * cost_factor
+            l = (l / 60.0) if not use_distance else l
+            if distances[u] + l < distances[v]:
+                distances[v] = distances[u] + l
+                predecessor[v] = u
+                predecessor_edge[v] = e
+                heapq.heappush(pq, (distances[v], v))
+    return distances, predecessor, predecessor_edge
+
+
+@njit(cache=True)
+def repair_dijkstra(
+    distances,
+    predecessor,
+    predecessor_edge,
+    adj_list,
+    edge_source,
+    edge_target,
+    edge_cost,
+    edge_reverse_cost,
+    edge_deleted,
+    inserted_edges,
+    removed_edges,
+    travel_time,
+    use_distance=False,
+    cost_factor=1.0,
+):
+    """
+    Repair the costs of a shortest path tree after edges were inserted or removed, only
+    the edited edges and the subtrees below removed edges are visited
+    :param distances: Costs of the shortest path tree
+    :param predecessor: Predecessor node of each node in the tree
+    :param predecessor_edge: Predecessor edge of each node in the tree
+    :param adj_list: Overlay adjacency list
+    :param edge_deleted: Mask of edges which are not relaxed after the repair
+    :param inserted_edges: Indices of inserted edges
+    :param removed_edges: Indices of removed edges
+    :param travel_time: Travel time matrix
+    :param cost_factor: Factor converting edge costs to seconds (or meters)
+    :return: Repaired costs
+    """
+    distances = distances.copy()
+
+    # Nodes reached through a removed edge lose their cost, as do their descendants in
+    # the tree, which are found among the neighbours of each node
+    affected = [0]
+    affected.pop()
+    for e in removed_edges:
+        for u in (edge_source[e], edge_target[e]):
+            if predecessor_edge[u] == e:
+                affected.append(u)
+    i = 0
+    while i < len(affected):
+        u = affected[i]
+        distances[u] = np.inf
+        for v, _, e in adj_list[u]:
+            v = int(v)
+            e = int(e)
+            if e >= 0 and predecessor_edge[v] == e and predecessor[v] == u:
+                affected.append(v)
+        i += 1
+
+    # Seed the search with inserted edges and with edges into affected nodes from the
+    # rest of the tree. As in a full search, only nodes within the travel time are
+    # relaxed, so costs beyond it match as well
+    seed_edges = [e for e in inserted_edges]
+    for u in affected:
+        for _, _, e in adj_list[u]:
+            if e >= 0:
+                seed_edges.append(int(e))
+
+    pq = [(0.0, 0)]
+    pq.pop()
+    for i in seed_edges:
+        if edge_deleted[i]:
+            continue
+        for u, v, l in (
+            (edge_source[i], edge_target[i], edge_cost[i]),
+            (edge_target[i], edge_source[i], edge_reverse_cost[i]),
+        ):
+            if not l >= 0.0 or distances[u] >= travel_time:
+                continue
+            l = l * cost_factor
+            l = (l / 60.0) if not use_distance else l
+            if distances[u] + l < distances[v]:
+                distances[v] = distances[u] + l
+                heapq.heappush(pq, (distances[v], v))
+
+    # Propagate improved costs, nodes may be pushed repeatedly so outdated entries are skipped
+    while len(pq) > 0:
+        if pq[0][0] >= travel_time:
+            break
+        d, u = heapq.heappop(pq)
+        if d > distances[u]:
+            continue
+        for v, l, e in adj_list[u]:
+            v = int(v)
+            e = int(e)
+            if e < 0 or not l >= 0.0 or edge_deleted[e]:
+                continue
+            l = l * cost_factor
+            l = (l / 60.0) if not use_distance else l
+            if distances[u] + l < distances[v]:
+                distances[v] = distances[u] + l
+                heapq.heappush(pq, (distances[v], v))
+    return distances
+
+
 @njit(cache=True)
 def array_equals(vertex, array):
     pointer = 0
@@ -275,6 +478,7 @@ def split_edges(
     geom_array,
     agg_costs,
     split_distance,
+    edge_deleted,
 ):
     """
     Split edges into multiple edges
@@ -284,6 +488,7 @@ def split_edges(
     :param edge_geom: List of edge geometries
     :param agg_costs: List of aggregated costs from dijkstra algorithm
     :param split_distance: Distance to split edges in meters
+    :param edge_deleted: Mask of edges removed by a scenario overlay, they are skipped
     :return: List of interpolated coordinates and costs along the line every x meters, including vertices
     """
     # start_time = time()
@@ -293,6 +498,8 @@ def split_edges(
 
     counter = -1
     for i in range(len(edge_source)):
+        if edge_deleted[i]:
+            continue
         source_id = edge_source[i]
         target_id = edge_target[i]
         source_cost = agg_costs[source_id]
@@ -367,25 +574,21 @@ def get_single_depth_grid_(zoom, west, north, data):
     return grid_data
 
 
-def get_geom_array(edges_geom):
-    geom_count = np.empty(len(edges_geom) + 1, dtype=np.intc)
-    geom_count[0] = 0
-    address = 1
-    for geom in edges_geom:
-        geom_count[address] = len(geom)
-        address += 1
-
-    all_geom_count = np.sum(geom_count)
-    geom_array = np.empty([all_geom_count, 2], dtype=np.double)
-    address = 0
-    for geom in edges_geom:
-        for point in geom:
-            geom_array[address] = point
-            address += 1
-
-    geom_address = np.cumsum(geom_count)
-
-    return geom_address, geom_array
+@njit(cache=True)
+def get_edges_length(geom_address, geom_array):
+    """
+    Compute the length of each edge from its geometry
+    :param geom_address: Start index of each edge's coordinates in the geometry array
+    :param geom_array: Array of all edge coordinates
+    :return: List of edge lengths in the geometry's unit
+    """
+    edges_length = np.zeros(len(geom_address) - 1, np.double)
+    for i in range(len(geom_address) - 1):
+        for j in range(geom_address[i], geom_address[i + 1] - 1):
+            dx = geom_array[j + 1, 0] - geom_array[j, 0]
+            dy = geom_array[j + 1, 1] - geom_array[j, 1]
+            edges_length[i] += math.sqrt(dx * dx + dy * dy)
+    return edges_length
 
 
 def build_grid_interpolate_(
@@ -489,6 +692,37 @@ def build_grid_interpolate_h3(
     return mapped_costs
 
 
+def aggregate_grid_h3(points, costs, grid_cells, max_traveltime):
+    """
+    Aggregate costs of points to the H3 cells containing them
+    :param points: List of points
+    :param costs: List of costs
+    :param grid_cells: H3_10 cells of the grid, sorted by index
+    :param max_traveltime: Maximum travel time (or distance)
+    :return: Minimum cost of the points within each cell
+    """
+    mapped_costs = np.full(len(grid_cells), np.inf, np.double)
+    if len(grid_cells) == 0:
+        return mapped_costs
+
+    # Map reachable points to cells of the grid in one pass
+    reachable = np.asarray(costs <= max_traveltime).nonzero()[0]
+    point_cells = web_mercator_to_h3_10(points[reachable])
+    positions = np.minimum(
+        np.searchsorted(grid_cells, point_cells), len(grid_cells) - 1
+    )
+    in_grid = grid_cells[positions] == point_cells
+
+    # Keep the minimum cost per cell
+    np.minimum.at(mapped_costs, positions[in_grid], costs[reachable][in_grid])
+    mapped_costs = np.rint(mapped_costs)
+
+    # Discard cost of cells which are further than the max travel time
+    mapped_costs[mapped_costs > max_traveltime] = np.nan
+
+    return mapped_costs
+
+
 def prepare_network_isochrone(edge_network_input):
     edge_network = edge_network_input.copy()
     # remap edges
@@ -496,11 +730,15 @@ def prepare_network_isochrone(edge_network_input):
     edges_target = edge_network["target"]
     edges_cost = edge_network["cost"]
     edges_reverse_cost = edge_network["reverse_cost"]
-    # time()
-    geom_address, geom_array = get_geom_array(edge_network["geom"])
-    # time()
-    # print(f"Convert geom array time: \t {end_time - start_time} s")
-    edges_length = np.array(edge_network["length"])
+    geom_address = edge_network["geom_address"]
+    geom_array = edge_network["geom_array"]
+    # Scenarios are applied as an overlay, edges they remove stay in the arrays but are masked
+    edges_deleted = edge_network.get("deleted")
+    if edges_deleted is None:
+        edges_deleted = np.zeros(len(edges_source), np.bool_)
+    # Mask of the base network if it's computed alongside the scenario
+    edges_base_deleted = edge_network.get("base_deleted")
+    edges_length = get_edges_length(geom_address, geom_array)
     # time()
     unordered_map, node_coords = remap_edges(
         edges_source, edges_target, geom_address, geom_array
@@ -524,9 +762,74 @@ def prepare_network_isochrone(edge_network_input):
         extent,
         geom_address,
         geom_array,
+        edges_deleted,
+        edges_base_deleted,
     )
 
 
+def compute_distances(
+    num_nodes,
+    edges_source,
+    edges_target,
+    edges_cost,
+    edges_reverse_cost,
+    edges_deleted,
+    edges_base_deleted,
+    start_vertices_ids,
+    travel_time,
+    is_distance_based,
+    cost_factor,
+):
+    """
+    Compute costs of the scenario network and, if given, the base network. The scenario
+    costs are repaired from the base shortest path tree, so only the part affected by
+    the scenario's edits is searched again
+    :return: Scenario costs and base costs or None
+    """
+    if edges_base_deleted is None:
+        adj_list = construct_adjacency_list_(
+            num_nodes,
+            edges_source,
+            edges_target,
+            edges_cost,
+            edges_reverse_cost,
+            edges_deleted,
+        )
+        distances = dijkstra(
+            start_vertices_ids, adj_list, travel_time, is_distance_based, cost_factor
+        )
+        return distances, None
+
+    adj_list = construct_overlay_adjacency_list_(
+        num_nodes, edges_source, edges_target, edges_cost, edges_reverse_cost
+    )
+    base_distances, predecessor, predecessor_edge = dijkstra_tree(
+        start_vertices_ids,
+        adj_list,
+        edges_base_deleted,
+        travel_time,
+        is_distance_based,
+        cost_factor,
+    )
+    distances = repair_dijkstra(
+        base_distances,
+        predecessor,
+        predecessor_edge,
+        adj_list,
+        edges_source,
+        edges_target,
+        edges_cost,
+        edges_reverse_cost,
+        edges_deleted,
+        np.flatnonzero(edges_base_deleted & ~edges_deleted),
+        np.flatnonzero(edges_deleted & ~edges_base_deleted),
+        travel_time,
+        is_distance_based,
+        cost_factor,
+    )
+    return distances, base_distances
+
+
 def network_to_grid(
     extent,
     zoom,
@@ -535,6 +838,7 @@ def network_to_grid(
     edges_length,
     geom_address,
     geom_array,
+    edges_deleted,
     distances,
     node_coords,
     speed,
@@ -577,6 +881,7 @@ def network_to_grid(
         geom_array,
         distances,
         min([web_mercator_x_step, web_mercator_y_step]),
+        edges_deleted,
     )
 
     node_coords_list = np.concatenate((node_coords, interpolated_coords))
@@ -616,6 +921,7 @@ def network_to_grid_h3(
     edges_length,
     geom_address,
     geom_array,
+    edges_deleted,
     distances,
     node_coords,
     speed,
@@ -623,7 +929,28 @@ def network_to_grid_h3(
     centroid_x,
     centroid_y,
     is_distance_based: bool,
+    grid_cells=None,
 ):
+    # Costs of the network are aggregated to the grid cells containing it, edges are split
+    # finer than the cell size, so every cell an edge crosses holds a point
+    if grid_cells is not None:
+        interpolated_coords, interpolated_costs = split_edges(
+            edges_source,
+            edges_target,
+            edges_length,
+            geom_address,
+            geom_array,
+            distances,
+            H3_10_AVERAGE_EDGE_LENGTH_M / 2,
+            edges_deleted,
+        )
+        return aggregate_grid_h3(
+            np.concatenate((node_coords, interpolated_coords)),
+            np.concatenate((distances, interpolated_costs)),
+            grid_cells,
+            max_traveltime,
+        )
+
     # Pixel coordinates origin is at the top left corner of the image. (y of top right/left corner is smaller than y of bottom right/left corner)
     xy_bottom_left = [
         math.floor(x)
@@ -651,6 +978,7 @@ def network_to_grid_h3(
         geom_array,
         distances,
         150.0,
+        edges_deleted,
     )
 
     node_coords_list = np.concatenate((node_coords, interpolated_coords))
@@ -686,6 +1014,7 @@ def compute_isochrone(
     zoom,
     return_network: bool = True,
     is_distance_based: bool = False,
+    cost_factor: float = 1.0,
 ):
     """
     Compute isochrone for a given start vertices
@@ -693,7 +1022,8 @@ def compute_isochrone(
     :param edge_network: Edge Network DataFrame
     :param start_vertices: List of start vertices
     :param travel_time: Travel time in minutes
-    :return: R5 Grid
+    :param cost_factor: Factor converting edge costs to seconds (or meters)
+    :return: R5 Grid, network and R5 Grid of the base network or None
     """
     (
         edges_source,
@@ -706,14 +1036,25 @@ def compute_isochrone(
         extent,
         geom_address,
         geom_array,
+        edges_deleted,
+        edges_base_deleted,
     ) = prepare_network_isochrone(edge_network_input=edge_network_input)
 
     # run dijkstra
-    adj_list = construct_adjacency_list_(
-        len(unordered_map), edges_source, edges_target, edges_cost, edges_reverse_cost
-    )
     start_vertices_ids = np.array([unordered_map[v] for v in start_vertices])
-    distances = dijkstra(start_vertices_ids, adj_list, travel_time, is_distance_based)
+    distances, base_distances = compute_distances(
+        len(unordered_map),
+        edges_source,
+        edges_target,
+        edges_cost,
+        edges_reverse_cost,
+        edges_deleted,
+        edges_base_deleted,
+        start_vertices_ids,
+        travel_time,
+        is_distance_based,
+        cost_factor,
+    )
 
     # convert results to grid
     grid_data = network_to_grid(
@@ -724,6 +1065,7 @@ def compute_isochrone(
         edges_length,
         geom_address,
         geom_array,
+        edges_deleted,
         distances,
         node_coords,
         speed,
@@ -731,30 +1073,68 @@ def compute_isochrone(
         is_distance_based,
     )
 
+    # Grid of the base network over the same extent, to compare the scenario against
+    base_grid_data = None
+    if base_distances is not None:
+        base_grid_data = network_to_grid(
+            extent,
+            zoom,
+            edges_source,
+            edges_target,
+            edges_length,
+            geom_address,
+            geom_array,
+            edges_base_deleted,
+            base_distances,
+            node_coords,
+            speed,
+            travel_time,
+            is_distance_based,
+        )
+
     # Convert network to geojson
     if return_network is True:
-        edges_length = range(len(edges_source))
-        network = {
-            "type": "FeatureCollection",
-            "features": [
+        # Convert all edge geometries to longitude / latitude in one pass
+        network_geom_array = web_mercator_to_wgs84(geom_array)
+        edges_cost = np.where(edges_deleted, np.inf, distances[edges_target])
+        # Edges reached in either network are kept if compared to the base network,
+        # costs are None where an edge isn't reached
+        if base_distances is not None:
+            edges_base_cost = np.where(
+                edges_base_deleted, np.inf, base_distances[edges_target]
+            )
+        else:
+            edges_base_cost = np.full(len(edges_source), np.inf)
+        features = []
+        for idx in range(len(edges_source)):
+            if edges_cost[idx] == np.inf and edges_base_cost[idx] == np.inf:
+                continue
+            if base_distances is None:
+                properties = {"cost": edges_cost[idx]}
+            else:
+                properties = {
+                    "cost": edges_cost[idx] if edges_cost[idx] != np.inf else None,
+                    "base_cost": edges_base_cost[idx]
+                    if edges_base_cost[idx] != np.inf
+                    else None,
+                }
+            features.append(
                 {
                     "type": "Feature",
                     "geometry": {
                         "type": "LineString",
-                        "coordinates": geom_array[
+                        "coordinates": network_geom_array[
                             geom_address[idx] : geom_address[idx + 1], :
                         ].tolist(),
                     },
-                    "properties": {"cost": distances[edges_target[idx]]},
+                    "properties": properties,
                 }
-                for idx in edges_length
-                if distances[edges_target[idx]] != np.inf
-            ],
-        }
+            )
+        network = {"type": "FeatureCollection", "features": features}
     else:
         network = None
 
-    return grid_data, network
+    return grid_data, network, base_grid_data
 
 
 def compute_isochrone_h3(
@@ -766,6 +1146,8 @@ def compute_isochrone_h3(
     centroid_y,
     zoom,
     is_distance_based: bool = False,
+    cost_factor: float = 1.0,
+    grid_cells=None,
 ):
     """
     Compute isochrone for a given start vertices
@@ -773,7 +1155,10 @@ def compute_isochrone_h3(
     :param edge_network: Edge Network DataFrame
     :param start_vertices: List of start vertices
     :param travel_time: Travel time in minutes
-    :return: R5 Grid
+    :param cost_factor: Factor converting edge costs to seconds (or meters)
+    :param grid_cells: Sorted H3 cells of the grid, if given costs are aggregated to
+        them instead of being interpolated to their centroids
+    :return: H3 grid costs and H3 grid costs of the base network or None
     """
     (
         edges_source,
@@ -786,14 +1171,25 @@ def compute_isochrone_h3(
         extent,
         geom_address,
         geom_array,
+        edges_deleted,
+        edges_base_deleted,
     ) = prepare_network_isochrone(edge_network_input=edge_network_input)
 
     # run dijkstra
-    adj_list = construct_adjacency_list_(
-        len(unordered_map), edges_source, edges_target, edges_cost, edges_reverse_cost
-    )
     start_vertices_ids = np.array([unordered_map[v] for v in start_vertices])
-    distances = dijkstra(start_vertices_ids, adj_list, travel_time, is_distance_based)
+    distances, base_distances = compute_distances(
+        len(unordered_map),
+        edges_source,
+        edges_target,
+        edges_cost,
+        edges_reverse_cost,
+        edges_deleted,
+        edges_base_deleted,
+        start_vertices_ids,
+        travel_time,
+        is_distance_based,
+        cost_factor,
+    )
 
     # convert results to grid
     grid_data = network_to_grid_h3(
@@ -804,6 +1200,7 @@ def compute_isochrone_h3(
         edges_length,
         geom_address,
         geom_array,
+        edges_deleted,
         distances,
         node_coords,
         speed,
@@ -811,6 +1208,29 @@ def compute_isochrone_h3(
         centroid_x,
         centroid_y,
         is_distance_based,
+        grid_cells,
     )
 
-    return grid_data
+    # Grid of the base network over the same cells, to compare the scenario against
+    base_grid_data = None
+    if base_distances is not None:
+        base_grid_data = network_to_grid_h3(
+            extent,
+            zoom,
+            edges_source,
+            edges_target,
+            edges_length,
+            geom_address,
+            geom_array,
+            edges_base_deleted,
+            base_distances,
+            node_coords,
+            speed,
+            travel_time,
+            centroid_x,
+            centroid_y,
+            is_distance_based,
+            grid_cells,
+        )
+
+    return grid_data, base_grid_data
@@ -13,11 +13,61 @@ import math
 import numpy as np
 from geopandas import GeoDataFrame
 from numba import njit
-from routing.utils import compute_r5_surface, coordinate_from_pixel, decode_r5_grid
+from routing.core.coordinate_transform import pixels_to_coordinates
+from routing.utils import (
+    TRAVEL_TIME_PERCENTILES,
+    compute_r5_surfaces,
+    decode_r5_grid,
+)
 from shapely.geometry import shape
 
 MAX_COORDS = 20000
 
+# Contour cells are grouped into square blocks, blocks entirely above or below a
+# cutoff can't contain a line and are skipped when contouring
+BLOCK_SIZE = 16
+BLOCK_EMPTY = 0
+BLOCK_FULL = 1
+BLOCK_MIXED = 2
+
+
+@njit
+def get_contour_index(surface, width, height, cutoff, x, y):
+    """
+    Get the marching squares index of a single contour cell
+    """
+    index = y * width + x
+    topLeft = surface[index] < cutoff
+    topRight = surface[index + 1] < cutoff
+    botLeft = surface[index + width] < cutoff
+    botRight = surface[index + width + 1] < cutoff
+
+    # if we're at the edge of the area, set the outer sides to false, so that
+    # isochrones always close even when they actually extend beyond the edges
+    # of the surface
+
+    if x == 0:
+        topLeft = botLeft = False
+    if x == width - 2:
+        topRight = botRight = False
+    if y == 0:
+        topLeft = topRight = False
+    if y == height - 2:
+        botRight = botLeft = False
+
+    idx = 0
+
+    if topLeft:
+        idx |= 1 << 3
+    if topRight:
+        idx |= 1 << 2
+    if botRight:
+        idx |= 1 << 1
+    if botLeft:
+        idx |= 1
+
+    return idx
+
 
 @njit
 def get_contour(surface, width, height, cutoff):
@@ -30,37 +80,107 @@ def get_contour(surface, width, height, cutoff):
     # compute contour values for each cell
     for x in range(width - 1):
         for y in range(height - 1):
-            index = y * width + x
-            topLeft = surface[index] < cutoff
-            topRight = surface[index + 1] < cutoff
-            botLeft = surface[index + width] < cutoff
-            botRight = surface[index + width + 1] < cutoff
-
-            # if we're at the edge of the area, set the outer sides to false, so that
-            # isochrones always close even when they actually extend beyond the edges
-            # of the surface
-
-            if x == 0:
-                topLeft = botLeft = False
-            if x == width - 2:
-                topRight = botRight = False
-            if y == 0:
-                topLeft = topRight = False
-            if y == height - 2:
-                botRight = botLeft = False
-
-            idx = 0
-
-            if topLeft:
-                idx |= 1 << 3
-            if topRight:
-                idx |= 1 << 2
-            if botRight:
-                idx |= 1 << 1
-            if botLeft:
-                idx |= 1
-
-            contour[y * (width - 1) + x] = idx
+            contour[y * (width - 1) + x] = get_contour_index(
+                surface, width, height, cutoff, x, y
+            )
+
+    return contour
+
+
+@njit
+def get_block_summaries(surfaces, width, height, block_size):
+    """
+    Get the minimum and maximum value of each block of contour cells across all
+    surfaces of a grid (one surface per row). A block of block_size x block_size
+    cells covers block_size + 1 surface values in each direction, as every cell
+    looks at its four corners.
+    """
+    cWidth = width - 1
+    cHeight = height - 1
+    blocksX = (cWidth + block_size - 1) // block_size
+    blocksY = (cHeight + block_size - 1) // block_size
+    block_min = np.empty((blocksY, blocksX), dtype=surfaces.dtype)
+    block_max = np.empty((blocksY, blocksX), dtype=surfaces.dtype)
+
+    for by in range(blocksY):
+        y0 = by * block_size
+        y1 = min(y0 + block_size, cHeight)
+        for bx in range(blocksX):
+            x0 = bx * block_size
+            x1 = min(x0 + block_size, cWidth)
+            value = surfaces[0, y0 * width + x0]
+            minimum = value
+            maximum = value
+            for surface in surfaces:
+                for y in range(y0, y1 + 1):
+                    for x in range(x0, x1 + 1):
+                        value = surface[y * width + x]
+                        if value < minimum:
+                            minimum = value
+                        if value > maximum:
+                            maximum = value
+            block_min[by, bx] = minimum
+            block_max[by, bx] = maximum
+
+    return block_min, block_max
+
+
+@njit
+def get_block_states(block_min, block_max, width, height, cutoff, block_size):
+    """
+    Classify each block of contour cells for a cutoff. Blocks entirely above the
+    cutoff only contain empty cells, blocks entirely below it only contain full
+    cells unless they touch the edge of the surface, which is always unreachable.
+    """
+    cWidth = width - 1
+    cHeight = height - 1
+    blocksY, blocksX = block_min.shape
+    block_states = np.empty((blocksY, blocksX), dtype=np.int8)
+
+    for by in range(blocksY):
+        y0 = by * block_size
+        y1 = min(y0 + block_size, cHeight)
+        for bx in range(blocksX):
+            x0 = bx * block_size
+            x1 = min(x0 + block_size, cWidth)
+            on_edge = x0 == 0 or y0 == 0 or x1 == cWidth or y1 == cHeight
+            if block_min[by, bx] >= cutoff:
+                block_states[by, bx] = BLOCK_EMPTY
+            elif block_max[by, bx] < cutoff and not on_edge:
+                block_states[by, bx] = BLOCK_FULL
+            else:
+                block_states[by, bx] = BLOCK_MIXED
+
+    return block_states
+
+
+@njit
+def get_contour_blocks(surface, width, height, cutoff, block_states, block_size):
+    """
+    Get a contouring grid, only evaluating cells of mixed blocks
+    """
+    cWidth = width - 1
+    cHeight = height - 1
+    contour = np.zeros(cWidth * cHeight, dtype=np.int8)
+    blocksY, blocksX = block_states.shape
+
+    for by in range(blocksY):
+        y0 = by * block_size
+        y1 = min(y0 + block_size, cHeight)
+        for bx in range(blocksX):
+            state = block_states[by, bx]
+            if state == BLOCK_EMPTY:
+                continue
+            x0 = bx * block_size
+            x1 = min(x0 + block_size, cWidth)
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    if state == BLOCK_FULL:
+                        contour[y * cWidth + x] = 15
+                    else:
+                        contour[y * cWidth + x] = get_contour_index(
+                            surface, width, height, cutoff, x, y
+                        )
 
     return contour
 
@@ -193,14 +313,84 @@ def calculate_jsolines(
     height,
     west,
     north,
-    zoom,
     cutoffs,
     interpolation=True,
-    web_mercator=True,
+):
+    """
+    Trace the isolines of a surface, coordinates of the returned rings are in
+    pixel space.
+    """
+    block_min, block_max = get_block_summaries(
+        surface.reshape((1, surface.size)), width, height, BLOCK_SIZE
+    )
+    return trace_jsolines(
+        surface,
+        width,
+        height,
+        west,
+        north,
+        cutoffs,
+        block_min,
+        block_max,
+        interpolation,
+    )
+
+
+@njit
+def calculate_jsolines_percentiles(
+    surfaces,
+    width,
+    height,
+    west,
+    north,
+    cutoffs,
+    interpolation=True,
+):
+    """
+    Trace the isolines of several surfaces of the same grid (one surface per row,
+    e.g. one per travel time percentile). The block summaries are computed once
+    for all surfaces, blocks which are uniform across all of them are skipped for
+    every surface.
+    """
+    block_min, block_max = get_block_summaries(surfaces, width, height, BLOCK_SIZE)
+    geometries = []
+    for i in range(surfaces.shape[0]):
+        geometries.append(
+            trace_jsolines(
+                surfaces[i],
+                width,
+                height,
+                west,
+                north,
+                cutoffs,
+                block_min,
+                block_max,
+                interpolation,
+            )
+        )
+    return geometries
+
+
+@njit
+def trace_jsolines(
+    surface,
+    width,
+    height,
+    west,
+    north,
+    cutoffs,
+    block_min,
+    block_max,
+    interpolation=True,
 ):
     geometries = []
     for _, cutoff in np.ndenumerate(cutoffs):
-        contour = get_contour(surface, width, height, cutoff)
+        block_states = get_block_states(
+            block_min, block_max, width, height, cutoff, BLOCK_SIZE
+        )
+        contour = get_contour_blocks(
+            surface, width, height, cutoff, block_states, BLOCK_SIZE
+        )
         cWidth = width - 1
         # Store warnings
         warnings = []
@@ -219,85 +409,88 @@ def calculate_jsolines(
         # area to your left. This lets us use winding direction to determine holes.
 
         for origy in range(height - 1):
-            for origx in range(width - 1):
-                index = origy * cWidth + origx
-                if found[index] == 1:
-                    continue
-                idx = contour[index]
-
-                # Continue if there is no line here or if it's a saddle, as we don't know which way the saddle goes.
-                if idx == 0 or idx == 5 or idx == 10 or idx == 15:
+            by = origy // BLOCK_SIZE
+            for bx in range(block_states.shape[1]):
+                # Skip blocks which can't contain a line
+                if block_states[by, bx] != BLOCK_MIXED:
                     continue
+                for origx in range(bx * BLOCK_SIZE, min((bx + 1) * BLOCK_SIZE, cWidth)):
+                    index = origy * cWidth + origx
+                    if found[index] == 1:
+                        continue
+                    idx = contour[index]
 
-                # Huzzah! We have found a line, now follow it, keeping the filled area to our left,
-                # which allows us to use the winding direction to determine what should be a shell and
-                # what should be a hole
-                pos = [origx, origy]
-                prev = [-1, -1]
-                start = [-1, -1]
+                    # Continue if there is no line here or if it's a saddle, as we don't know which way the saddle goes.
+                    if idx == 0 or idx == 5 or idx == 10 or idx == 15:
+                        continue
 
-                # Track winding direction
-                direction = 0
-                coords = []
+                    # Huzzah! We have found a line, now follow it, keeping the filled area to our left,
+                    # which allows us to use the winding direction to determine what should be a shell and
+                    # what should be a hole
+                    pos = [origx, origy]
+                    prev = [-1, -1]
+                    start = [-1, -1]
 
-                # Make sure we're not traveling in circles.
-                # NB using index from _previous_ cell, we have not yet set an index for this cell
+                    # Track winding direction
+                    direction = 0
+                    coords = []
 
-                while found[index] != 1:
-                    prev = start
-                    start = pos
-                    idx = contour[index]
+                    # Make sure we're not traveling in circles.
+                    # NB using index from _previous_ cell, we have not yet set an index for this cell
 
-                    indices.append(idx)
+                    while found[index] != 1:
+                        prev = start
+                        start = pos
+                        idx = contour[index]
 
-                    # Mark as found if it's not a saddle because we expect to reach saddles twice.
-                    if idx != 5 and idx != 10:
-                        found[index] = 1
+                        indices.append(idx)
 
-                    if idx == 0 or idx >= 15:
-                        warnings.append("Ran off outside of ring")
-                        break
+                        # Mark as found if it's not a saddle because we expect to reach saddles twice.
+                        if idx != 5 and idx != 10:
+                            found[index] = 1
 
-                    # Follow the loop
-                    pos = followLoop(idx, pos, prev)
-                    index = pos[1] * cWidth + pos[0]
+                        if idx == 0 or idx >= 15:
+                            warnings.append("Ran off outside of ring")
+                            break
 
-                    # Keep track of winding direction
-                    direction += (pos[0] - start[0]) * (pos[1] + start[1])
+                        # Follow the loop
+                        pos = followLoop(idx, pos, prev)
+                        index = pos[1] * cWidth + pos[0]
 
-                    # Shift exact coordinates
-                    if interpolation:
-                        coord = interpolate(pos, cutoff, start, surface, width, height)
-                    else:
-                        coord = noInterpolate(pos, start)
+                        # Keep track of winding direction
+                        direction += (pos[0] - start[0]) * (pos[1] + start[1])
 
-                    if not coord:
-                        warnings.append(
-                            f"Unexpected coo rdinate shift from ${start[0]}, ${start[1]} to ${pos[0]}, ${pos[1]}, discarding ring"
-                        )
-                        break
-                    xy = coordinate_from_pixel(
-                        [coord[0] + west, coord[1] + north],
-                        zoom=zoom,
-                        web_mercator=web_mercator,
-                    )
-                    coords.append(xy)
-
-                    # We're back at the start of the ring
-                    if pos[0] == origx and pos[1] == origy:
-                        coords.append(coords[0])  # close the ring
-
-                        # make it a fully-fledged GeoJSON object
-                        geom = [coords]
-
-                        # Check winding direction. Positive here means counter clockwise,
-                        # see http:#stackoverflow.com/questions/1165647
-                        # +y is down so the signs are reversed from what would be expected
-                        if direction > 0:
-                            shells.append(geom)
+                        # Shift exact coordinates
+                        if interpolation:
+                            coord = interpolate(
+                                pos, cutoff, start, surface, width, height
+                            )
                         else:
-                            holes.append(geom)
-                        break
+                            coord = noInterpolate(pos, start)
+
+                        if not coord:
+                            warnings.append(
+                                f"Unexpected coo rdinate shift from ${start[0]}, ${start[1]} to ${pos[0]}, ${pos[1]}, discarding ring"
+                            )
+                            break
+                        # Rings are traced in pixel space and converted in one pass later
+                        coords.append([float(coord[0] + west), float(coord[1] + north)])
+
+                        # We're back at the start of the ring
+                        if pos[0] == origx and pos[1] == origy:
+                            coords.append(coords[0])  # close the ring
+
+                            # make it a fully-fledged GeoJSON object
+                            geom = [coords]
+
+                            # Check winding direction. Positive here means counter clockwise,
+                            # see http:#stackoverflow.com/questions/1165647
+                            # +y is down so the signs are reversed from what would be expected
+                            if direction > 0:
+                                shells.append(geom)
+                            else:
+                                holes.append(geom)
+                            break
 
         # Shell game time. Sort out shells and holes.
         for hole in holes:
@@ -345,6 +538,37 @@ def pointinpolygon(x, y, poly):
     return inside
 
 
+def convert_jsolines_coordinates(geometries, zoom, web_mercator=False):
+    """
+    Convert the pixel coordinates of all rings to longitude / latitude or web
+    mercator coordinates in a single vectorized pass.
+
+    :param geometries: Multipolygon coordinates in pixel space, one per cutoff.
+    :param zoom: The zoom level of the surface.
+    :param web_mercator: Whether to convert to web mercator coordinates.
+
+    :return: Multipolygon coordinates with every ring as an (n, 2) array.
+    """
+
+    rings = [
+        np.asarray(ring, dtype=np.double)
+        for multipolygon in geometries
+        for polygon in multipolygon
+        for ring in polygon
+    ]
+    if len(rings) == 0:
+        return geometries
+
+    coordinates = pixels_to_coordinates(np.concatenate(rings), zoom, web_mercator)
+    ring_offsets = np.cumsum([len(ring) for ring in rings])[:-1]
+    converted_rings = iter(np.split(coordinates, ring_offsets))
+
+    return [
+        [[next(converted_rings) for _ in polygon] for polygon in multipolygon]
+        for multipolygon in geometries
+    ]
+
+
 def jsolines(
     surface,
     width,
@@ -375,9 +599,84 @@ def jsolines(
     """
 
     isochrone_multipolygon_coordinates = calculate_jsolines(
-        surface, width, height, west, north, zoom, cutoffs, interpolation, web_mercator
+        surface, width, height, west, north, cutoffs, interpolation
+    )
+    isochrone_multipolygon_coordinates = convert_jsolines_coordinates(
+        isochrone_multipolygon_coordinates, zoom, web_mercator
+    )
+
+    return build_jsolines_result(
+        isochrone_multipolygon_coordinates, cutoffs, return_incremental, web_mercator
+    )
+
+
+def jsolines_percentiles(
+    surfaces,
+    percentiles,
+    width,
+    height,
+    west,
+    north,
+    zoom,
+    cutoffs,
+    interpolation=True,
+    return_incremental=False,
+    web_mercator=False,
+):
+    """
+    Calculate isolines from several surfaces of the same grid in one pass.
+
+    :param surfaces: A 2D array with one surface per row.
+    :param percentiles: The percentile of each surface.
+    :param width: The width of the surfaces.
+    :param height: The height of the surfaces.
+    :param west: The western edge of the surfaces.
+    :param north: The northern edge of the surfaces.
+    :param zoom: The zoom level of the surfaces.
+    :param cutoffs: A list of cutoff values.
+    :param interpolation: Whether to interpolate between pixels.
+    :param return_incremental: Whether to also return incremental isolines.
+    :param web_mercator: Whether to use web mercator coordinates.
+
+    :return: A dictionary with the isolines of each percentile, see jsolines.
+    """
+
+    percentile_coordinates = calculate_jsolines_percentiles(
+        surfaces, width, height, west, north, cutoffs, interpolation
+    )
+
+    # Convert the rings of all percentiles at once
+    isochrone_multipolygon_coordinates = convert_jsolines_coordinates(
+        [
+            isochrone
+            for coordinates in percentile_coordinates
+            for isochrone in coordinates
+        ],
+        zoom,
+        web_mercator,
     )
 
+    result = {}
+    for i, percentile in enumerate(percentiles):
+        result[percentile] = build_jsolines_result(
+            isochrone_multipolygon_coordinates[
+                i * len(cutoffs) : (i + 1) * len(cutoffs)
+            ],
+            cutoffs,
+            return_incremental,
+            web_mercator,
+        )
+
+    return result
+
+
+def build_jsolines_result(
+    isochrone_multipolygon_coordinates, cutoffs, return_incremental, web_mercator
+):
+    """
+    Build full and/or incremental isoline geodataframes from multipolygon coordinates.
+    """
+
     result = {}
     isochrone_shapes = []
     for isochrone in isochrone_multipolygon_coordinates:
@@ -417,13 +716,25 @@ def generate_jsolines(grid, travel_time, percentile, steps):
     :return: A GeoDataFrame with the jsolines.
 
     """
-    single_value_surface = compute_r5_surface(
+    return generate_jsolines_percentiles(grid, travel_time, [percentile], steps)[
+        percentile
+    ]
+
+
+def generate_jsolines_percentiles(grid, travel_time, percentiles, steps):
+    """
+    Generate the jsolines of several percentiles of a multi-depth grid in one pass.
+
+    :return: A dictionary with the jsolines of each percentile.
+
+    """
+    surfaces = compute_r5_surfaces(
         grid,
-        percentile,
+        percentiles,
     )
-    grid["surface"] = single_value_surface
-    isochrones = jsolines(
-        grid["surface"],
+    isochrones = jsolines_percentiles(
+        surfaces,
+        percentiles,
         grid["width"],
         grid["height"],
         grid["west"],
@@ -441,20 +752,11 @@ if __name__ == "__main__":
         fileContent = file.read()
 
         grid_decoded = decode_r5_grid(fileContent)
-        grid_decoded["surface"] = compute_r5_surface(
-            grid_decoded,
-            5,
-        )
 
-        cutoffs = np.arange(60, 61)
-        isochrones = jsolines(
-            grid_decoded["surface"],
-            grid_decoded["width"],
-            grid_decoded["height"],
-            grid_decoded["west"],
-            grid_decoded["north"],
-            grid_decoded["zoom"],
-            cutoffs,
-            return_incremental=True,
-            web_mercator=False,
+        # Contour all travel time percentiles of the grid in one pass
+        isochrones = generate_jsolines_percentiles(
+            grid_decoded,
+            travel_time=60,
+            percentiles=TRAVEL_TIME_PERCENTILES,
+            steps=6,
         )
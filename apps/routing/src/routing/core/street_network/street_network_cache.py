@@ -1,49 +1,192 @@
+import fcntl
 import os
+import threading
+from contextlib import contextmanager, suppress
+from typing import Iterator
 from uuid import UUID
 
 import polars as pl
-from polars import DataFrame
+from polars import DataFrame, LazyFrame
 from routing.core.config import settings
 
+# Included in cache file names, increase when the cached segment schema changes
+CACHE_SCHEMA_VERSION = 2
+
+CACHE_FILE_EXTENSIONS = {
+    "parquet": "parquet",
+    "ipc": "arrow",
+}
+
 
 class StreetNetworkCache:
-    def __init__(self) -> None:
+    def __init__(
+        self, cache_format: str | None = None, cache_dir: str | None = None
+    ) -> None:
         """Initialize the cache directory if it does not exist."""
 
-        if not os.path.exists(settings.CACHE_DIR):
-            os.makedirs(settings.CACHE_DIR)
+        self.cache_format = cache_format or settings.STREET_NETWORK_CACHE_FORMAT
+        if self.cache_format not in CACHE_FILE_EXTENSIONS:
+            raise ValueError(
+                f"Unsupported street network cache format {self.cache_format}."
+            )
+
+        self.cache_dir = cache_dir or settings.CACHE_DIR
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
 
     def _get_edge_cache_file_name(
         self,
         edge_layer_id: UUID,
-        h3_short: str,
+        h3_short: int,
+        mode: str | None = None,
     ) -> str:
-        """Get edge cache file path for the specified H3_3 cell."""
+        """Get edge cache file path for the specified H3_3 cell, or for its network
+        variant if a routing mode is specified."""
 
+        edge_type = f"{mode}_edge" if mode else "edge"
         return os.path.join(
-            settings.CACHE_DIR,
-            f"{str(edge_layer_id)}_{h3_short}_edge.parquet",
+            self.cache_dir,
+            f"{str(edge_layer_id)}_{h3_short}_{edge_type}_v{CACHE_SCHEMA_VERSION}.{CACHE_FILE_EXTENSIONS[self.cache_format]}",
         )
 
     def _get_node_cache_file_name(
         self,
         node_layer_id: UUID,
-        h3_short: str,
+        h3_short: int,
     ) -> str:
         """Get node cache file path for the specified H3_3 cell."""
 
         return os.path.join(
-            settings.CACHE_DIR,
-            f"{node_layer_id}_{h3_short}_node.parquet",
+            self.cache_dir,
+            f"{node_layer_id}_{h3_short}_node.{CACHE_FILE_EXTENSIONS[self.cache_format]}",
+        )
+
+    def _get_edge_version_file_name(
+        self,
+        edge_layer_id: UUID,
+        h3_short: int,
+        mode: str | None = None,
+    ) -> str:
+        """Get version file path of the edge cache for the specified H3_3 cell."""
+
+        edge_type = f"{mode}_edge" if mode else "edge"
+        return os.path.join(
+            self.cache_dir,
+            f"{str(edge_layer_id)}_{h3_short}_{edge_type}_v{CACHE_SCHEMA_VERSION}.version",
+        )
+
+    def _get_scenario_cache_file_name(
+        self,
+        scenario_id: UUID,
+        edge_layer_project_id: int,
+        node_layer_project_id: int,
+        version: str | None = None,
+    ) -> str:
+        """Get cache file path of network modifications of a scenario, or the file name
+        prefix shared by all its versions if no version is specified."""
+
+        prefix = f"scenario_{str(scenario_id)}_{edge_layer_project_id}_{node_layer_project_id}_"
+        if version is None:
+            return os.path.join(self.cache_dir, prefix)
+        return os.path.join(
+            self.cache_dir,
+            f"{prefix}{version}_v{CACHE_SCHEMA_VERSION}.{CACHE_FILE_EXTENSIONS[self.cache_format]}",
+        )
+
+    def _read_cache_file(self, cache_file: str) -> DataFrame:
+        """Read a cache file, IPC files are memory-mapped instead of being decoded."""
+
+        if self.cache_format == "ipc":
+            # Without rechunking, columns remain zero-copy views of the mapped file
+            return pl.read_ipc(cache_file, memory_map=True, rechunk=False)
+
+        with open(cache_file, "rb") as file:
+            return pl.read_parquet(file)
+
+    def _get_temp_file_name(self, file_name: str) -> str:
+        """Get a temporary file path, unique to the current process and thread."""
+
+        return f"{file_name}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _write_cache_file(self, cache_file: str, df: DataFrame) -> None:
+        """Write a cache file in the configured format.
+
+        Data is written to a temporary file which is then renamed, so readers
+        never see a partially written cache file.
+        """
+
+        temp_file = self._get_temp_file_name(cache_file)
+        try:
+            with open(temp_file, "wb") as file:
+                if self.cache_format == "ipc":
+                    # Memory mapping requires uncompressed data, a single record batch
+                    # allows reading the file without rechunking
+                    df.rechunk().write_ipc(file, compression="uncompressed")
+                else:
+                    df.write_parquet(
+                        file,
+                        row_group_size=settings.STREET_NETWORK_CACHE_ROW_GROUP_SIZE,
+                        statistics=True,
+                    )
+            os.replace(temp_file, cache_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _write_version_file(self, version_file: str, version: str) -> None:
+        """Write a version file, replacing any previous version atomically."""
+
+        temp_file = self._get_temp_file_name(version_file)
+        try:
+            with open(temp_file, "w") as file:
+                file.write(version)
+            os.replace(temp_file, version_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    @contextmanager
+    def lock_cell(
+        self,
+        layer_id: UUID,
+        h3_short: int,
+        layer_type: str = "edge",
+    ) -> Iterator[None]:
+        """Hold an exclusive lock on a cached H3_3 cell across processes and threads.
+
+        Used to ensure a missing cell is fetched from the database only once, other
+        callers wait for the lock and then read the cached result.
+        """
+
+        lock_file = os.path.join(
+            self.cache_dir, f"{str(layer_id)}_{h3_short}_{layer_type}.lock"
         )
+        with open(lock_file, "a") as file:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
 
-    def edge_cache_exists(self, edge_layer_id: UUID, h3_short: str) -> bool:
+    def edge_cache_exists(
+        self, edge_layer_id: UUID, h3_short: int, mode: str | None = None
+    ) -> bool:
         """Check if edge data for the specified H3_3 cell is cached."""
 
-        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short, mode)
         return os.path.exists(edge_cache_file)
 
-    def node_cache_exists(self, node_layer_id: UUID, h3_short: str) -> bool:
+    def edge_cache_size(
+        self, edge_layer_id: UUID, h3_short: int, mode: str | None = None
+    ) -> int:
+        """Get the size in bytes of cached edge data for the specified H3_3 cell."""
+
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short, mode)
+        return (
+            os.path.getsize(edge_cache_file) if os.path.exists(edge_cache_file) else 0
+        )
+
+    def node_cache_exists(self, node_layer_id: UUID, h3_short: int) -> bool:
         """Check if node data for the specified H3_3 cell is cached."""
 
         node_cache_file = self._get_node_cache_file_name(node_layer_id, h3_short)
@@ -52,17 +195,17 @@ class StreetNetworkCache:
     def read_edge_cache(
         self,
         edge_layer_id: UUID,
-        h3_short: str,
+        h3_short: int,
+        mode: str | None = None,
     ) -> DataFrame:
         """Read edge data for the specified H3_3 cell from cache."""
 
         edge_df: DataFrame | None = None
 
-        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short, mode)
 
         try:
-            with open(edge_cache_file, "rb") as file:
-                edge_df = pl.read_parquet(file)
+            edge_df = self._read_cache_file(edge_cache_file)
         except Exception:
             raise ValueError(
                 f"Failed to read edge data for H3_3 cell {h3_short} from cache."
@@ -70,10 +213,40 @@ class StreetNetworkCache:
 
         return edge_df
 
+    def scan_edge_cache(
+        self,
+        edge_layer_id: UUID,
+        h3_short: int,
+        mode: str | None = None,
+    ) -> LazyFrame:
+        """Scan edge data for the specified H3_3 cell from cache lazily, filters are
+        pushed down so only relevant row groups are read."""
+
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short, mode)
+
+        if self.cache_format == "ipc":
+            return pl.scan_ipc(edge_cache_file, memory_map=True, rechunk=False)
+        return pl.scan_parquet(edge_cache_file, rechunk=False)
+
+    def read_edge_cache_version(
+        self,
+        edge_layer_id: UUID,
+        h3_short: int,
+        mode: str | None = None,
+    ) -> str | None:
+        """Read the data version of cached edge data for the specified H3_3 cell."""
+
+        version_file = self._get_edge_version_file_name(edge_layer_id, h3_short, mode)
+        if not os.path.exists(version_file):
+            return None
+
+        with open(version_file, "r") as file:
+            return file.read().strip()
+
     def read_node_cache(
         self,
         node_layer_id: UUID,
-        h3_short: str,
+        h3_short: int,
     ) -> DataFrame:
         """Read node data for the specified H3_3 cell from cache."""
 
@@ -82,8 +255,7 @@ class StreetNetworkCache:
         node_cache_file = self._get_node_cache_file_name(node_layer_id, h3_short)
 
         try:
-            with open(node_cache_file, "rb") as file:
-                node_df = pl.read_parquet(file)
+            node_df = self._read_cache_file(node_cache_file)
         except Exception:
             raise ValueError(
                 f"Failed to read node data for H3_3 cell {h3_short} from cache."
@@ -94,28 +266,99 @@ class StreetNetworkCache:
     def write_edge_cache(
         self,
         edge_layer_id: UUID,
-        h3_short: str,
+        h3_short: int,
         edge_df: DataFrame,
+        version: str | None = None,
+        mode: str | None = None,
     ) -> None:
-        """Write edge data for the specified H3_3 cell into cache."""
+        """Write edge data for the specified H3_3 cell (or its network variant) into
+        cache, stamped with the data version it was fetched at."""
 
-        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short)
+        edge_cache_file = self._get_edge_cache_file_name(edge_layer_id, h3_short, mode)
+        version_file = self._get_edge_version_file_name(edge_layer_id, h3_short, mode)
 
         try:
-            with open(edge_cache_file, "wb") as file:
-                edge_df.write_parquet(file)
+            # Sorting clusters edges of the same H3_6 cell and class into few row groups,
+            # network variants are already restricted to the classes of their mode
+            sort_columns = (
+                ["h3_6", "class_"] if "class_" in edge_df.columns else ["h3_6"]
+            )
+            self._write_cache_file(edge_cache_file, edge_df.sort(sort_columns))
+
+            # Version is written after the data, so readers never see a new version with old data
+            if version is not None:
+                self._write_version_file(version_file, version)
+            elif os.path.exists(version_file):
+                os.remove(version_file)
         except Exception:
-            # Clean up cache file if writing fails
-            if os.path.exists(edge_cache_file):
-                os.remove(edge_cache_file)
             raise RuntimeError(
                 f"Failed to write edge data for H3_3 cell {h3_short} into cache."
             )
 
+    def read_scenario_cache(
+        self,
+        scenario_id: UUID,
+        edge_layer_project_id: int,
+        node_layer_project_id: int,
+        version: str,
+    ) -> DataFrame | None:
+        """Read network modifications of a scenario version from cache, returns None if
+        they aren't cached."""
+
+        scenario_cache_file = self._get_scenario_cache_file_name(
+            scenario_id, edge_layer_project_id, node_layer_project_id, version
+        )
+        if not os.path.exists(scenario_cache_file):
+            return None
+
+        try:
+            return self._read_cache_file(scenario_cache_file)
+        except Exception:
+            raise ValueError(
+                f"Failed to read network modifications of scenario {scenario_id} from cache."
+            )
+
+    def write_scenario_cache(
+        self,
+        scenario_id: UUID,
+        edge_layer_project_id: int,
+        node_layer_project_id: int,
+        version: str,
+        modifications_df: DataFrame,
+    ) -> None:
+        """Write network modifications of a scenario version into cache, replacing
+        previous versions of the scenario."""
+
+        scenario_cache_file = self._get_scenario_cache_file_name(
+            scenario_id, edge_layer_project_id, node_layer_project_id, version
+        )
+        prefix = self._get_scenario_cache_file_name(
+            scenario_id, edge_layer_project_id, node_layer_project_id
+        )
+
+        try:
+            self._write_cache_file(scenario_cache_file, modifications_df)
+
+            # Previous versions are never read again
+            for file_name in os.listdir(self.cache_dir):
+                cache_file = os.path.join(self.cache_dir, file_name)
+                if (
+                    cache_file.startswith(prefix)
+                    and cache_file != scenario_cache_file
+                    and not cache_file.endswith(".tmp")
+                ):
+                    # Another process may have removed it concurrently
+                    with suppress(FileNotFoundError):
+                        os.remove(cache_file)
+        except Exception:
+            raise RuntimeError(
+                f"Failed to write network modifications of scenario {scenario_id} into cache."
+            )
+
     def write_node_cache(
         self,
         node_layer_id: UUID,
-        h3_short: str,
+        h3_short: int,
         node_df: DataFrame,
     ) -> None:
         """Write node data for the specified H3_3 cell into cache."""
@@ -123,12 +366,8 @@ class StreetNetworkCache:
         node_cache_file = self._get_node_cache_file_name(node_layer_id, h3_short)
 
         try:
-            with open(node_cache_file, "wb") as file:
-                node_df.write_parquet(file)
+            self._write_cache_file(node_cache_file, node_df)
         except Exception:
-            # Clean up cache file if writing fails
-            if os.path.exists(node_cache_file):
-                os.remove(node_cache_file)
             raise RuntimeError(
                 f"Failed to write node data for H3_3 cell {h3_short} into cache."
             )
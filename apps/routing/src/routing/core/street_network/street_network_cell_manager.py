@@ -0,0 +1,440 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+import polars as pl
+from routing.core.config import settings
+from routing.core.street_network.street_network_cache import StreetNetworkCache
+from routing.core.street_network.street_network_metrics import StreetNetworkMetrics
+from routing.core.street_network.street_network_snapping import SegmentIndex
+from routing.core.street_network.street_network_variant import build_network_variant
+
+if TYPE_CHECKING:
+    from routing.core.street_network.street_network_util import StreetNetworkUtil
+
+
+class StreetNetworkCellManager:
+    def __init__(
+        self,
+        street_network_util: "StreetNetworkUtil",
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list[int],
+        memory_budget_gb: float | None = None,
+        metrics: StreetNetworkMetrics | None = None,
+    ) -> None:
+        """Hold the H3_3 cells of a street network, loading them on first access.
+
+        If a shared memory directory is configured, cells are published there as
+        uncompressed IPC files and memory-mapped, so worker processes on the same
+        host share a single copy of the network.
+
+        If metrics are specified, every cell load and the resident size of loaded cells
+        are recorded.
+        """
+
+        self.street_network_util = street_network_util
+        self.street_network_cache = StreetNetworkCache()
+        self.shared_cache = (
+            StreetNetworkCache(
+                cache_format="ipc",
+                cache_dir=settings.STREET_NETWORK_SHARED_MEMORY_DIR,
+            )
+            if settings.STREET_NETWORK_SHARED_MEMORY_DIR
+            else None
+        )
+        self.edge_layer_id = edge_layer_id
+        self.edge_table = edge_table
+        self.h3_3_cells = set(h3_3_cells)
+        self.memory_budget_gb = (
+            memory_budget_gb
+            if memory_budget_gb is not None
+            else settings.STREET_NETWORK_MEMORY_BUDGET_GB
+        )
+        self.metrics = metrics
+
+        # Loaded cells and their network variants, keyed by H3_3 cell and routing mode,
+        # ordered from least to most recently used
+        self._cells: OrderedDict[tuple[int, str | None], pl.DataFrame] = OrderedDict()
+        self._cell_sizes: dict[tuple[int, str | None], float] = {}
+        self._cell_versions: dict[tuple[int, str | None], str | None] = {}
+        # Spatial indexes over the segments of loaded cells, built on first use
+        self._segment_indexes: dict[tuple[int, str | None], SegmentIndex] = {}
+        # Last read version of each cached cell and the time it was read at
+        self._source_versions: dict[int, tuple[float, str | None]] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, h3_short: int) -> bool:
+        """Check if the H3_3 cell is part of the street network region."""
+
+        return h3_short in self.h3_3_cells
+
+    @property
+    def size_gb(self) -> float:
+        """In-memory size of all currently loaded cells."""
+
+        return sum(self._cell_sizes.values())
+
+    def get(
+        self,
+        h3_short: int,
+        default: pl.DataFrame | None = None,
+        mode: str | None = None,
+    ) -> pl.DataFrame | pl.LazyFrame | None:
+        """Get edge data of a H3_3 cell, loading it if it's not in memory or if the
+        cache holds a newer version of it.
+
+        If a routing mode is specified, the mode's network variant of the cell is
+        returned instead. With lazy scans enabled, a lazy scan of the cached cell
+        is returned.
+        """
+
+        if h3_short not in self.h3_3_cells:
+            return default
+
+        if settings.STREET_NETWORK_LAZY_SCAN:
+            return self._scan_cell(h3_short, mode)
+
+        # Read the cached version before the data, a concurrent refresh then results in a
+        # reload on the next access rather than a stale cell
+        cached_version = self._read_source_version(h3_short)
+
+        key = (h3_short, mode)
+        with self._lock:
+            edge_df = self._cells.get(key)
+            if edge_df is not None and (
+                cached_version is None or cached_version == self._cell_versions[key]
+            ):
+                self._cells.move_to_end(key)
+                return edge_df
+
+        # Load cell outside the lock, so other cells remain accessible
+        edge_df = self._load_cell(h3_short, mode)
+        if cached_version is None:
+            cached_version = self._read_source_version(h3_short, force=True)
+
+        with self._lock:
+            self._store(key, edge_df, cached_version)
+            self._evict()
+            edge_df = self._cells[key]
+        self._record_worker()
+        return edge_df
+
+    def get_cells(
+        self, h3_3_cells: list[int], mode: str | None = None
+    ) -> dict[int, pl.DataFrame | pl.LazyFrame | None]:
+        """Get edge data of several H3_3 cells, see get.
+
+        Cells missing from cache are fetched in one bulk query, cells which aren't in
+        memory are then loaded concurrently by a bounded thread pool.
+        """
+
+        self.street_network_util.prefetch_edge_cells(
+            self.street_network_cache,
+            self.edge_layer_id,
+            self.edge_table,
+            [h3_short for h3_short in h3_3_cells if h3_short in self.h3_3_cells],
+        )
+
+        if len(h3_3_cells) <= 1:
+            return {h3_short: self.get(h3_short, mode=mode) for h3_short in h3_3_cells}
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(h3_3_cells), settings.STREET_NETWORK_FETCH_WORKERS)
+        ) as executor:
+            edge_dfs = executor.map(
+                lambda h3_short: self.get(h3_short, mode=mode), h3_3_cells
+            )
+            return dict(zip(h3_3_cells, edge_dfs))
+
+    def get_segment_index(self, h3_short: int, mode: str) -> SegmentIndex | None:
+        """Get a spatial index over the segments of a cell's network variant, the index
+        is kept until the cell is reloaded or evicted."""
+
+        edge_df = self.get(h3_short, mode=mode)
+        if edge_df is None:
+            return None
+
+        # Lazily scanned cells aren't held in memory, neither are their indexes
+        if isinstance(edge_df, pl.LazyFrame):
+            return SegmentIndex(edge_df.collect())
+
+        key = (h3_short, mode)
+        with self._lock:
+            segment_index = self._segment_indexes.get(key)
+            if segment_index is not None and segment_index.edge_df is edge_df:
+                return segment_index
+
+        # Build index outside the lock, so other cells remain accessible
+        segment_index = SegmentIndex(edge_df)
+        with self._lock:
+            if self._cells.get(key) is edge_df:
+                self._segment_indexes[key] = segment_index
+        return segment_index
+
+    def refresh(self) -> list[int]:
+        """Re-fetch cells whose data version changed in the database and swap loaded
+        cells for their new version, returns the refreshed cells."""
+
+        refreshed_cells = self.street_network_util.refresh_edge_cells(
+            self.street_network_cache,
+            self.edge_layer_id,
+            self.edge_table,
+            list(self.h3_3_cells),
+        )
+
+        for h3_short in refreshed_cells:
+            # Republish cells in shared memory, other processes reload them on next access
+            if self.shared_cache is not None and self.shared_cache.edge_cache_exists(
+                self.edge_layer_id, h3_short
+            ):
+                self._publish_cell(h3_short, republish=True)
+
+        # Swap loaded cells and their network variants
+        for key in list(self._cells.keys()):
+            h3_short, mode = key
+            if h3_short not in refreshed_cells:
+                continue
+            version = self._read_source_version(h3_short, force=True)
+            edge_df = self._load_cell(h3_short, mode)
+            with self._lock:
+                # Only swap cells which haven't been evicted in the meantime
+                if key in self._cells:
+                    self._store(key, edge_df, version)
+        self._record_worker()
+
+        return refreshed_cells
+
+    @property
+    def _source_cache(self) -> StreetNetworkCache:
+        """Cache which loaded cells are read from."""
+
+        return (
+            self.shared_cache
+            if self.shared_cache is not None
+            else self.street_network_cache
+        )
+
+    def _read_source_version(self, h3_short: int, force: bool = False) -> str | None:
+        """Read the version of a cached cell, the last read version is reused within
+        the version check interval unless forced."""
+
+        now = time.time()
+        checked = self._source_versions.get(h3_short)
+        if (
+            not force
+            and checked is not None
+            and now - checked[0] < settings.STREET_NETWORK_VERSION_CHECK_INTERVAL
+        ):
+            return checked[1]
+
+        version = self._source_cache.read_edge_cache_version(
+            self.edge_layer_id, h3_short
+        )
+        self._source_versions[h3_short] = (now, version)
+        return version
+
+    def _load_cell(self, h3_short: int, mode: str | None = None) -> pl.DataFrame:
+        """Load edge data of a H3_3 cell, from shared memory if enabled."""
+
+        start_time = time.time()
+
+        # Use a prebuilt network variant if it's up to date with the cached cell, with
+        # shared memory enabled the variant is published so all processes map its pages
+        source_cache, source_mode = self._source_cache, None
+        if mode and self._is_variant_current(source_cache, h3_short, mode):
+            source_mode = mode
+        cache_hit = source_cache.edge_cache_exists(
+            self.edge_layer_id, h3_short, source_mode
+        )
+        if mode and not source_mode and self.shared_cache is not None:
+            self._publish_variant(h3_short, mode)
+            if self._is_variant_current(self.shared_cache, h3_short, mode):
+                source_mode = mode
+
+        if source_mode:
+            # Memory-mapped read-only if read from shared memory
+            edge_df = source_cache.read_edge_cache(self.edge_layer_id, h3_short, mode)
+        elif self.shared_cache is None:
+            edge_df = self.street_network_util.load_edge_cell(
+                self.street_network_cache,
+                self.edge_layer_id,
+                self.edge_table,
+                h3_short,
+            )
+        else:
+            if not self.shared_cache.edge_cache_exists(self.edge_layer_id, h3_short):
+                self._publish_cell(h3_short)
+
+            # Memory-mapped read-only, pages are shared by all processes attached to the cell
+            edge_df = self.shared_cache.read_edge_cache(self.edge_layer_id, h3_short)
+
+        load_time = time.time() - start_time
+
+        # Fall back to building the network variant in-process if none was published
+        if mode and not source_mode:
+            edge_df = build_network_variant(edge_df, mode)
+
+        if self.metrics is not None:
+            self.metrics.record_cell_load(
+                h3_short,
+                mode,
+                cache_hit=cache_hit,
+                bytes_read=source_cache.edge_cache_size(
+                    self.edge_layer_id, h3_short, source_mode
+                )
+                if cache_hit
+                else 0,
+                load_time=load_time,
+                rows=edge_df.height,
+                size_gb=edge_df.estimated_size("gb"),
+            )
+
+        return edge_df
+
+    def _scan_cell(self, h3_short: int, mode: str | None = None) -> pl.LazyFrame:
+        """Scan edge data of a H3_3 cell lazily, caching it first if missing.
+
+        If a routing mode is specified, its cached network variant is scanned if it's
+        up to date, otherwise the variant is derived from the cell.
+        """
+
+        if self.shared_cache is not None:
+            if not self.shared_cache.edge_cache_exists(self.edge_layer_id, h3_short):
+                self._publish_cell(h3_short)
+            if mode and not self._is_variant_current(self.shared_cache, h3_short, mode):
+                self._publish_variant(h3_short, mode)
+        else:
+            self.street_network_util.prefetch_edge_cells(
+                self.street_network_cache,
+                self.edge_layer_id,
+                self.edge_table,
+                [h3_short],
+            )
+
+        source_cache = self._source_cache
+        if mode and self._is_variant_current(source_cache, h3_short, mode):
+            return source_cache.scan_edge_cache(self.edge_layer_id, h3_short, mode)
+
+        edge_lf = source_cache.scan_edge_cache(self.edge_layer_id, h3_short)
+        return build_network_variant(edge_lf, mode) if mode else edge_lf
+
+    def _publish_cell(self, h3_short: int, republish: bool = False) -> None:
+        """Publish edge data of a H3_3 cell into shared memory, only one process per
+        host loads the cell while others wait for it."""
+
+        shared_cache = self.shared_cache
+        if shared_cache is None:
+            return
+
+        with shared_cache.lock_cell(self.edge_layer_id, h3_short, "edge"):
+            if not republish and shared_cache.edge_cache_exists(
+                self.edge_layer_id, h3_short
+            ):
+                return
+
+            edge_df = self.street_network_util.load_edge_cell(
+                self.street_network_cache,
+                self.edge_layer_id,
+                self.edge_table,
+                h3_short,
+            )
+            version = self.street_network_cache.read_edge_cache_version(
+                self.edge_layer_id, h3_short
+            )
+            if republish and version == shared_cache.read_edge_cache_version(
+                self.edge_layer_id, h3_short
+            ):
+                return
+
+            shared_cache.write_edge_cache(
+                self.edge_layer_id, h3_short, edge_df, version
+            )
+
+    def _publish_variant(self, h3_short: int, mode: str) -> None:
+        """Publish the network variant of a H3_3 cell into shared memory, a prebuilt
+        variant is copied if it's up to date, otherwise it's built from the cell."""
+
+        shared_cache = self.shared_cache
+        if shared_cache is None:
+            return
+
+        if not shared_cache.edge_cache_exists(self.edge_layer_id, h3_short):
+            self._publish_cell(h3_short)
+
+        with shared_cache.lock_cell(self.edge_layer_id, h3_short, f"{mode}_edge"):
+            # Read the version before the data, a concurrent republish then results in
+            # a stale variant which is rebuilt on the next access
+            version = shared_cache.read_edge_cache_version(self.edge_layer_id, h3_short)
+            if version is None or self._is_variant_current(
+                shared_cache, h3_short, mode
+            ):
+                return
+
+            if (
+                self.street_network_cache.read_edge_cache_version(
+                    self.edge_layer_id, h3_short, mode
+                )
+                == version
+            ):
+                edge_df = self.street_network_cache.read_edge_cache(
+                    self.edge_layer_id, h3_short, mode
+                )
+            else:
+                edge_df = build_network_variant(
+                    shared_cache.read_edge_cache(self.edge_layer_id, h3_short), mode
+                )
+
+            try:
+                shared_cache.write_edge_cache(
+                    self.edge_layer_id, h3_short, edge_df, version, mode
+                )
+            except RuntimeError as e:
+                print(f"Failed to publish {mode} network variant, error: {e}")
+
+    def _is_variant_current(
+        self, cache: StreetNetworkCache, h3_short: int, mode: str
+    ) -> bool:
+        """Check if a cached network variant is up to date with its cached cell."""
+
+        version = cache.read_edge_cache_version(self.edge_layer_id, h3_short)
+        return version is not None and (
+            cache.read_edge_cache_version(self.edge_layer_id, h3_short, mode) == version
+        )
+
+    def _store(
+        self, key: tuple[int, str | None], edge_df: pl.DataFrame, version: str | None
+    ) -> None:
+        """Insert or replace a loaded cell as the most recently used one, the caller
+        must hold the lock."""
+
+        self._cells[key] = edge_df
+        self._cell_sizes[key] = edge_df.estimated_size("gb")
+        self._cell_versions[key] = version
+        self._segment_indexes.pop(key, None)
+        self._cells.move_to_end(key)
+
+    def _evict(self) -> None:
+        """Evict least recently used cells until the memory budget is met, the most
+        recently used cell is always kept."""
+
+        while self.size_gb > self.memory_budget_gb and len(self._cells) > 1:
+            key, _ = self._cells.popitem(last=False)
+            del self._cell_sizes[key]
+            del self._cell_versions[key]
+            self._segment_indexes.pop(key, None)
+            if settings.ENVIRONMENT == "dev":
+                print(f"Evicted street network H3_3 cell {key[0]} from memory")
+
+    def _record_worker(self) -> None:
+        """Record the resident size of cells loaded by this worker process."""
+
+        if self.metrics is None:
+            return
+
+        with self._lock:
+            num_cells, size_gb = len(self._cells), self.size_gb
+        self.metrics.record_worker(num_cells, size_gb)
@@ -0,0 +1,24 @@
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def flatten_coordinates(
+    coordinates: pl.Series,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.double]]:
+    """Flatten lists of [x, y] points into the start index of each segment's points and
+    a contiguous (n, 2) array of all points, without iterating over segments."""
+
+    coordinates = coordinates.to_arrow()
+    if isinstance(coordinates, pa.ChunkedArray):
+        coordinates = coordinates.combine_chunks()
+
+    points = pc.list_flatten(coordinates)
+    num_points = pc.list_value_length(coordinates).to_numpy(zero_copy_only=False)
+    geom_address = np.zeros(len(num_points) + 1, dtype=np.int64)
+    np.cumsum(num_points, out=geom_address[1:])
+
+    geom_array = pc.list_flatten(points).to_numpy().reshape(-1, 2)
+    return geom_address, geom_array
@@ -0,0 +1,74 @@
+import json
+import os
+import socket
+import time
+from uuid import UUID
+
+from redis import Redis
+from routing.core.config import settings
+
+
+class StreetNetworkMetrics:
+    def __init__(self, redis: Redis, edge_layer_id: UUID) -> None:
+        """Publish street network load metrics into Redis hashes.
+
+        Per-cell metrics are stored in a hash per edge layer, keyed by H3_3 cell.
+        Resident network size is stored in a hash keyed by worker process.
+        """
+
+        self.redis = redis
+        self.cell_metrics_key = (
+            f"{settings.STREET_NETWORK_METRICS_KEY}:cells:{str(edge_layer_id)}"
+        )
+        self.worker_metrics_key = f"{settings.STREET_NETWORK_METRICS_KEY}:workers"
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def record_cell_load(
+        self,
+        h3_short: int,
+        mode: str | None,
+        cache_hit: bool,
+        bytes_read: int,
+        load_time: float,
+        rows: int,
+        size_gb: float,
+    ) -> None:
+        """Record metrics of loading a H3_3 cell into memory.
+
+        For cache hits the load time is the time spent decoding the cache file, for
+        misses it's the time spent fetching the cell from the database.
+        """
+
+        metrics: dict[str, str | bool | int | float | None] = {
+            "mode": mode,
+            "cache_hit": cache_hit,
+            "bytes_read": bytes_read,
+            "decode_time": load_time if cache_hit else None,
+            "fetch_time": None if cache_hit else load_time,
+            "rows": rows,
+            "size_gb": size_gb,
+            "worker": self.worker_id,
+            "loaded_at": time.time(),
+        }
+        field = f"{h3_short}:{mode}" if mode else str(h3_short)
+        self._publish(self.cell_metrics_key, field, metrics)
+
+    def record_worker(self, num_cells: int, size_gb: float) -> None:
+        """Record the resident street network size of this worker process."""
+
+        metrics: dict[str, str | bool | int | float | None] = {
+            "cells": num_cells,
+            "size_gb": size_gb,
+            "updated_at": time.time(),
+        }
+        self._publish(self.worker_metrics_key, self.worker_id, metrics)
+
+    def _publish(
+        self, key: str, field: str, metrics: dict[str, str | bool | int | float | None]
+    ) -> None:
+        """Write metrics into a Redis hash, failures never interrupt loading."""
+
+        try:
+            self.redis.hset(key, field, json.dumps(metrics))
+        except Exception as e:
+            print(f"Failed to publish street network metrics, error: {e}")
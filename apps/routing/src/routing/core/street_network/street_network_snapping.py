@@ -0,0 +1,254 @@
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from routing.core.street_network.street_network_geometry import flatten_coordinates
+from routing.core.street_network.street_network_variant import NETWORK_VARIANT_COLUMNS
+from scipy.spatial import cKDTree
+
+
+class SegmentIndex:
+    def __init__(self, edge_df: pl.DataFrame) -> None:
+        """Spatial index over the line pieces of street network segments.
+
+        A KD-tree holds the midpoint of every piece between two consecutive points of
+        a segment's geometry. Queries are widened by half the longest piece, so all
+        pieces within the query distance of a point are found.
+        """
+
+        self.edge_df = edge_df
+        self.edge_ids = edge_df.get_column("id").to_numpy()
+        self.geom_address, self.geom_array = flatten_coordinates(
+            edge_df.get_column("coordinates_3857")
+        )
+
+        # Every point of a segment's geometry except its last one starts a piece
+        num_points = np.diff(self.geom_address)
+        is_piece_start = np.ones(len(self.geom_array), dtype=np.bool_)
+        is_piece_start[self.geom_address[1:][num_points > 0] - 1] = False
+        self.piece_start = np.flatnonzero(is_piece_start)
+        self.piece_edge = np.repeat(np.arange(len(num_points)), num_points)[
+            self.piece_start
+        ]
+
+        start = self.geom_array[self.piece_start]
+        end = self.geom_array[self.piece_start + 1]
+        self.max_half_length = (
+            np.hypot(*(end - start).T).max() / 2 if len(self.piece_start) else 0.0
+        )
+        self.tree = cKDTree((start + end) / 2) if len(self.piece_start) else None
+
+    def query(
+        self,
+        points: npt.NDArray[np.double],
+        max_distance: npt.NDArray[np.double],
+        excluded_ids: npt.NDArray[np.int64],
+    ) -> tuple[
+        npt.NDArray[np.int64],
+        npt.NDArray[np.int64],
+        npt.NDArray[np.double],
+        npt.NDArray[np.double],
+    ]:
+        """Find the nearest segment of each point within its maximum distance.
+
+        Returns the segment's row, the geometry index of the nearest piece's start,
+        the fraction along that piece and the distance, rows are -1 if no segment
+        is within the maximum distance.
+        """
+
+        edge_row = np.full(len(points), -1, dtype=np.int64)
+        piece_start = np.zeros(len(points), dtype=np.int64)
+        fraction = np.zeros(len(points), dtype=np.double)
+        distance = np.full(len(points), np.inf, dtype=np.double)
+        if self.tree is None or len(points) == 0:
+            return edge_row, piece_start, fraction, distance
+
+        candidates = self.tree.query_ball_point(
+            points, max_distance + self.max_half_length
+        )
+        num_candidates = np.fromiter(
+            (len(c) for c in candidates), dtype=np.int64, count=len(points)
+        )
+        if num_candidates.sum() == 0:
+            return edge_row, piece_start, fraction, distance
+        point_index = np.repeat(np.arange(len(points)), num_candidates)
+        piece_index = np.concatenate(candidates).astype(np.int64)
+
+        # Pieces of segments which are removed by the scenario can't be snapped to
+        is_valid = ~np.isin(self.edge_ids[self.piece_edge[piece_index]], excluded_ids)
+        point_index, piece_index = point_index[is_valid], piece_index[is_valid]
+
+        # Project points onto their candidate pieces
+        start = self.geom_array[self.piece_start[piece_index]]
+        vector = self.geom_array[self.piece_start[piece_index] + 1] - start
+        offset = points[point_index] - start
+        squared_length = np.einsum("ij,ij->i", vector, vector)
+        candidate_fraction = np.clip(
+            np.divide(
+                np.einsum("ij,ij->i", offset, vector),
+                squared_length,
+                out=np.zeros_like(squared_length),
+                where=squared_length > 0,
+            ),
+            0.0,
+            1.0,
+        )
+        candidate_distance = np.hypot(
+            *(offset - candidate_fraction[:, None] * vector).T
+        )
+
+        # Keep the nearest candidate of each point
+        order = np.lexsort((candidate_distance, point_index))
+        point_index, piece_index = point_index[order], piece_index[order]
+        candidate_fraction = candidate_fraction[order]
+        candidate_distance = candidate_distance[order]
+        is_nearest = np.ones(len(point_index), dtype=np.bool_)
+        is_nearest[1:] = point_index[1:] != point_index[:-1]
+        is_nearest &= candidate_distance <= max_distance[point_index]
+
+        nearest = point_index[is_nearest]
+        edge_row[nearest] = self.piece_edge[piece_index[is_nearest]]
+        piece_start[nearest] = self.piece_start[piece_index[is_nearest]]
+        fraction[nearest] = candidate_fraction[is_nearest]
+        distance[nearest] = candidate_distance[is_nearest]
+
+        return edge_row, piece_start, fraction, distance
+
+
+def snap_points(
+    segment_indexes: list[SegmentIndex],
+    points: npt.NDArray[np.double],
+    max_distance: npt.NDArray[np.double],
+    excluded_ids: list[int],
+) -> tuple[pl.DataFrame, list[int], list[int]]:
+    """Snap points to their nearest segment and split segments at snapped points.
+
+    Returns the artificial segments as a network variant, the ID of the segment each
+    of them replaces and the indices of the points which were snapped. Each snapped point
+    becomes the connector with ID -(point index + 1), artificial segments have
+    negative IDs as well.
+    """
+
+    excluded_id_array: npt.NDArray[np.int64] = np.asarray(excluded_ids, dtype=np.int64)
+
+    # Find the nearest segment of each point across all indexes
+    nearest_index = np.full(len(points), -1, dtype=np.int64)
+    nearest_row = np.full(len(points), -1, dtype=np.int64)
+    nearest_piece_start = np.zeros(len(points), dtype=np.int64)
+    nearest_fraction = np.zeros(len(points), dtype=np.double)
+    nearest_distance = np.full(len(points), np.inf, dtype=np.double)
+    for i, segment_index in enumerate(segment_indexes):
+        edge_row, piece_start, fraction, distance = segment_index.query(
+            points, max_distance, excluded_id_array
+        )
+        is_nearer = (edge_row >= 0) & (distance < nearest_distance)
+        nearest_index[is_nearer] = i
+        nearest_row[is_nearer] = edge_row[is_nearer]
+        nearest_piece_start[is_nearer] = piece_start[is_nearer]
+        nearest_fraction[is_nearer] = fraction[is_nearer]
+        nearest_distance[is_nearer] = distance[is_nearer]
+
+    snapped_points = np.flatnonzero(nearest_row >= 0)
+
+    # Split each snapped segment at its points, ordered along the segment
+    order = np.lexsort(
+        (
+            nearest_fraction[snapped_points],
+            nearest_piece_start[snapped_points],
+            nearest_row[snapped_points],
+            nearest_index[snapped_points],
+        )
+    )
+    snapped_points = snapped_points[order]
+
+    segment_columns: dict[str, list[Any]] = {
+        column: [] for column in NETWORK_VARIANT_COLUMNS
+    }
+    replaced_ids: list[int] = []
+    group_start = 0
+    while group_start < len(snapped_points):
+        segment_index = segment_indexes[nearest_index[snapped_points[group_start]]]
+        row = nearest_row[snapped_points[group_start]]
+        group_end = group_start + 1
+        while (
+            group_end < len(snapped_points)
+            and nearest_index[snapped_points[group_end]]
+            == nearest_index[snapped_points[group_start]]
+            and nearest_row[snapped_points[group_end]] == row
+        ):
+            group_end += 1
+        group = snapped_points[group_start:group_end]
+        group_start = group_end
+
+        segment = segment_index.edge_df.row(row, named=True)
+        geom_start = segment_index.geom_address[row]
+        coordinates = segment_index.geom_array[
+            geom_start : segment_index.geom_address[row + 1]
+        ]
+
+        # Position of each split point along the segment geometry
+        piece_length = np.hypot(*np.diff(coordinates, axis=0).T)
+        position = np.concatenate(([0.0], np.cumsum(piece_length)))
+        piece = nearest_piece_start[group] - geom_start
+        split_position = np.concatenate(
+            (
+                [0.0],
+                position[piece] + nearest_fraction[group] * piece_length[piece],
+                [position[-1]],
+            )
+        )
+        split_coordinates = coordinates[piece] + nearest_fraction[group][:, None] * (
+            coordinates[piece + 1] - coordinates[piece]
+        )
+
+        nodes = [segment["source"], *(-(group + 1)).tolist(), segment["target"]]
+        for i in range(len(group) + 1):
+            # Geometry of the piece between two consecutive split points
+            piece_coordinates = np.concatenate(
+                (
+                    split_coordinates[i - 1 : i] if i > 0 else coordinates[:1],
+                    coordinates[
+                        (piece[i - 1] + 1 if i > 0 else 1) : (
+                            piece[i] + 1 if i < len(group) else len(coordinates) - 1
+                        )
+                    ],
+                    split_coordinates[i : i + 1]
+                    if i < len(group)
+                    else coordinates[-1:],
+                )
+            )
+            share = (
+                (split_position[i + 1] - split_position[i]) / position[-1]
+                if position[-1] > 0
+                else 1 / (len(group) + 1)
+            )
+
+            segment_columns["id"].append(-(len(segment_columns["id"]) + 1))
+            replaced_ids.append(segment["id"])
+            segment_columns["source"].append(nodes[i])
+            segment_columns["target"].append(nodes[i + 1])
+            segment_columns["length_m"].append(segment["length_m"] * share)
+            segment_columns["coordinates_3857"].append(piece_coordinates.tolist())
+            segment_columns["h3_6"].append(segment["h3_6"])
+            # Unit costs are proportional to the length within a segment
+            segment_columns["cost"].append(
+                segment["cost"] * share if segment["cost"] is not None else None
+            )
+            segment_columns["reverse_cost"].append(
+                segment["reverse_cost"] * share
+                if segment["reverse_cost"] is not None
+                else None
+            )
+
+    artificial_segments = pl.DataFrame(
+        segment_columns,
+        schema={
+            column: segment_indexes[0].edge_df.schema[column]
+            for column in NETWORK_VARIANT_COLUMNS
+        }
+        if segment_indexes
+        else None,
+    )
+
+    return artificial_segments, replaced_ids, np.sort(snapped_points).tolist()
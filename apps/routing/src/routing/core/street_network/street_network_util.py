@@ -1,13 +1,95 @@
-import time
+from contextlib import ExitStack
+from typing import Any, Sequence
 from uuid import UUID
 
+import numpy as np
 import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+from redis import Redis
 from routing.core.config import settings
 from routing.core.street_network.street_network_cache import StreetNetworkCache
-from routing.schemas.catchment_area import CONNECTOR_DATA_SCHEMA, SEGMENT_DATA_SCHEMA
+from routing.core.street_network.street_network_cell_manager import (
+    StreetNetworkCellManager,
+)
+from routing.core.street_network.street_network_metrics import StreetNetworkMetrics
+from routing.schemas.catchment_area import (
+    SEGMENT_CLASSES,
+    SEGMENT_DATA_SCHEMA,
+    SEGMENT_TEXT_SCHEMA,
+)
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+# Data version of a H3_3 cell without any edges
+EMPTY_CELL_VERSION = "0-0"
+
+# Edge coordinates are fetched as a flat array of [x0, y0, x1, y1, ...]
+SEGMENT_FETCH_SCHEMA = {
+    **SEGMENT_TEXT_SCHEMA,
+    "coordinates_3857": pl.List(pl.Float64),
+}
+
+
+def to_segment_schema(edge_df: pl.DataFrame) -> pl.DataFrame:
+    """Cast raw segment data to the compact segment schema, classes unknown to routing
+    are stored as "other"."""
+
+    return edge_df.select(
+        pl.when(pl.col("class_").is_in(SEGMENT_CLASSES))
+        .then(pl.col("class_"))
+        .otherwise(pl.lit("other"))
+        .cast(SEGMENT_DATA_SCHEMA["class_"])
+        .alias("class_")
+        if column == "class_"
+        else pl.col(column).cast(dtype)
+        for column, dtype in SEGMENT_DATA_SCHEMA.items()
+    )
+
+
+def read_segment_rows(columns: list[str], rows: Sequence[Any]) -> pl.DataFrame:
+    """Build a segment dataframe from all rows of a SQL result at once, coordinates
+    are decoded from JSON text as a whole column."""
+
+    segment_df = pl.DataFrame(
+        rows, schema=columns, orient="row", infer_schema_length=None
+    )
+    segment_df = segment_df.cast(
+        {
+            column: SEGMENT_TEXT_SCHEMA[column]
+            for column in columns
+            if column in SEGMENT_TEXT_SCHEMA
+        }
+    )
+    return segment_df.with_columns(
+        pl.col("coordinates_3857").str.json_decode(
+            SEGMENT_DATA_SCHEMA["coordinates_3857"]
+        )
+    )
+
+
+def reshape_coordinates(edge_df: pl.DataFrame) -> pl.DataFrame:
+    """Reshape flat coordinate arrays into lists of [x, y] points.
+
+    Point lists share the flat coordinate values, only the list offsets are rebuilt.
+    """
+
+    coordinates = edge_df.get_column("coordinates_3857").to_arrow()
+    if isinstance(coordinates, pa.ChunkedArray):
+        coordinates = coordinates.combine_chunks()
+
+    values = pc.list_flatten(coordinates)
+    num_values = pc.list_value_length(coordinates).to_numpy(zero_copy_only=False)
+    offsets = np.zeros(len(num_values) + 1, dtype=np.int64)
+    np.cumsum(num_values // 2, out=offsets[1:])
+
+    points = pa.LargeListArray.from_arrays(
+        offsets, pa.FixedSizeListArray.from_arrays(values, 2)
+    )
+    return edge_df.with_columns(
+        pl.Series("coordinates_3857", points).cast(pl.List(pl.List(pl.Float64)))
+    )
+
 
 class StreetNetworkUtil:
     def __init__(self, db_connection: AsyncSession) -> None:
@@ -38,8 +120,8 @@ class StreetNetworkUtil:
 
     async def _get_street_network_tables(
         self,
-        edge_layer_id: UUID,
-        node_layer_id: UUID,
+        edge_layer_id: UUID | None,
+        node_layer_id: UUID | None,
     ) -> tuple[str | None, str | None]:
         """Get table names and layer IDs of the edge and node tables."""
 
@@ -76,7 +158,7 @@ class StreetNetworkUtil:
 
     async def _get_street_network_region_h3_3_cells(
         self, region_geofence_table: str
-    ) -> list[str]:
+    ) -> list[int]:
         """Get list of H3_3 cells covering the street network region."""
 
         h3_3_cells = []
@@ -101,127 +183,268 @@ class StreetNetworkUtil:
 
         return h3_3_cells
 
-    async def fetch(
+    def fetch_edge_cell_versions(
         self,
         edge_layer_id: UUID,
-        node_layer_id: UUID,
-        region_geofence_table: str,
-    ) -> tuple[dict[str, pl.DataFrame], dict[str, pl.DataFrame]]:
-        """Fetch street network from specified layer and load into Polars dataframes."""
+        edge_table: str,
+        h3_3_cells: list[int] | None = None,
+    ) -> dict[int, str]:
+        """Fetch data versions of all H3_3 cells (or the specified cells) of an edge layer.
+
+        The version is a checksum of all edge rows within a cell, so any insert,
+        update or deletion of an edge changes the version of its cell.
+        """
+
+        cell_filter = (
+            f"AND h3_3 = ANY(ARRAY[{', '.join(str(h3_short) for h3_short in h3_3_cells)}]::integer[])"
+            if h3_3_cells is not None
+            else ""
+        )
+        versions_df = pl.read_database_uri(
+            query=f"""
+                SELECT h3_3, COUNT(*)::text || '-' || SUM(hashtext(e::text)::bigint)::text AS version
+                FROM {edge_table} e
+                WHERE layer_id = '{str(edge_layer_id)}'
+                {cell_filter}
+                GROUP BY h3_3
+            """,
+            uri=settings.POSTGRES_DATABASE_URI,
+        )
+
+        return dict(
+            zip(versions_df["h3_3"].to_list(), versions_df["version"].to_list())
+        )
+
+    def fetch_edge_cells(
+        self,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list[int],
+    ) -> dict[int, pl.DataFrame]:
+        """Fetch edge data of several H3_3 cells from the database in one bulk query.
+
+        Rows are transferred in Arrow's binary format with coordinates as a flat
+        float8 array, the query is split into parallel partitions on the H3_3 index.
+        """
+
+        if settings.ENVIRONMENT == "dev":
+            print(f"Fetching street network edge data for {len(h3_3_cells)} H3_3 cells")
+
+        edge_df = pl.read_database_uri(
+            query=f"""
+                SELECT
+                    edge_id AS id, length_m, class_, impedance_slope, impedance_slope_reverse,
+                    impedance_surface,
+                    ARRAY(SELECT jsonb_path_query(coordinates_3857::jsonb, '$[*][*]')::float8) AS coordinates_3857,
+                    maxspeed_forward, maxspeed_backward, source, target, h3_3, h3_6
+                FROM {edge_table}
+                WHERE h3_3 = ANY(ARRAY[{', '.join(str(h3_short) for h3_short in h3_3_cells)}]::integer[])
+                AND layer_id = '{str(edge_layer_id)}'
+            """,
+            uri=settings.POSTGRES_DATABASE_URI,
+            partition_on="h3_3" if len(h3_3_cells) > 1 else None,
+            partition_num=min(len(h3_3_cells), settings.STREET_NETWORK_FETCH_WORKERS)
+            if len(h3_3_cells) > 1
+            else None,
+            schema_overrides=SEGMENT_FETCH_SCHEMA,
+        )
+        edge_df = reshape_coordinates(edge_df)
+
+        # Split into cells, cells without any edges get an empty dataframe
+        edge_dfs = {
+            key[0]: to_segment_schema(cell_df)
+            for key, cell_df in edge_df.partition_by("h3_3", as_dict=True).items()
+        }
+        return {
+            h3_short: edge_dfs.get(h3_short, to_segment_schema(edge_df.clear()))
+            for h3_short in h3_3_cells
+        }
+
+    def fetch_edge_cell(
+        self,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_short: int,
+    ) -> pl.DataFrame:
+        """Fetch edge data of a H3_3 cell from the database."""
 
-        # Street network is stored as a dictionary of Polars dataframes, with the H3_3 index as the key
-        street_network_edge = {}
-        street_network_node = {}
+        return self.fetch_edge_cells(edge_layer_id, edge_table, [h3_short])[h3_short]
 
-        start_time = time.time()
-        street_network_size: float = 0.0
+    def prefetch_edge_cells(
+        self,
+        street_network_cache: StreetNetworkCache,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list[int],
+    ) -> None:
+        """Fetch all uncached H3_3 cells in one bulk query and write them into cache."""
+
+        missing_cells = [
+            h3_short
+            for h3_short in h3_3_cells
+            if not street_network_cache.edge_cache_exists(edge_layer_id, h3_short)
+        ]
+        if not missing_cells:
+            return
+
+        # Locks are acquired in a fixed order, so concurrent prefetches can't deadlock
+        with ExitStack() as stack:
+            for h3_short in sorted(missing_cells):
+                stack.enter_context(
+                    street_network_cache.lock_cell(edge_layer_id, h3_short, "edge")
+                )
 
-        # Get H3_3 cells covering the street network region
-        street_network_region_h3_3_cells = (
-            await self._get_street_network_region_h3_3_cells(region_geofence_table)
+            # Skip cells cached by another process while waiting for the locks
+            missing_cells = [
+                h3_short
+                for h3_short in missing_cells
+                if not street_network_cache.edge_cache_exists(edge_layer_id, h3_short)
+            ]
+            if not missing_cells:
+                return
+
+            # Get versions before the data, so concurrent edits are picked up by the next refresh
+            versions = self.fetch_edge_cell_versions(
+                edge_layer_id, edge_table, missing_cells
+            )
+            edge_dfs = self.fetch_edge_cells(edge_layer_id, edge_table, missing_cells)
+
+            for h3_short, edge_df in edge_dfs.items():
+                street_network_cache.write_edge_cache(
+                    edge_layer_id,
+                    h3_short,
+                    edge_df,
+                    versions.get(h3_short, EMPTY_CELL_VERSION),
+                )
+
+    def load_edge_cell(
+        self,
+        street_network_cache: StreetNetworkCache,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_short: int,
+    ) -> pl.DataFrame:
+        """Load edge data of a H3_3 cell from cache, fetch and cache it if missing."""
+
+        if street_network_cache.edge_cache_exists(edge_layer_id, h3_short):
+            # Read edge data from cache
+            return street_network_cache.read_edge_cache(edge_layer_id, h3_short)
+
+        # Only one process fetches a missing cell, others wait and read it from cache
+        with street_network_cache.lock_cell(edge_layer_id, h3_short, "edge"):
+            if street_network_cache.edge_cache_exists(edge_layer_id, h3_short):
+                return street_network_cache.read_edge_cache(edge_layer_id, h3_short)
+
+            # Get the version before the data, so concurrent edits are picked up by the next refresh
+            version = self.fetch_edge_cell_versions(
+                edge_layer_id, edge_table, [h3_short]
+            ).get(h3_short, EMPTY_CELL_VERSION)
+
+            # Read edge data from database
+            edge_df = self.fetch_edge_cell(edge_layer_id, edge_table, h3_short)
+
+            # Write edge data into cache
+            street_network_cache.write_edge_cache(
+                edge_layer_id, h3_short, edge_df, version
+            )
+
+        return edge_df
+
+    def refresh_edge_cells(
+        self,
+        street_network_cache: StreetNetworkCache,
+        edge_layer_id: UUID,
+        edge_table: str,
+        h3_3_cells: list[int],
+    ) -> list[int]:
+        """Re-fetch cached H3_3 cells whose data version changed, returns the refreshed cells.
+
+        Cells which are not cached yet are skipped, they are fetched at their current
+        version once they are first loaded.
+        """
+
+        cached_cells = [
+            h3_short
+            for h3_short in h3_3_cells
+            if street_network_cache.edge_cache_exists(edge_layer_id, h3_short)
+        ]
+        if not cached_cells:
+            return []
+
+        # Versions are only computed for cached cells
+        versions = self.fetch_edge_cell_versions(
+            edge_layer_id, edge_table, cached_cells
         )
 
-        # Get table names and layer IDs of the edge and node tables
-        (
-            street_network_edge_table,
-            street_network_node_table,
-        ) = await self._get_street_network_tables(edge_layer_id, node_layer_id)
+        outdated_cells = []
+        for h3_short in cached_cells:
+            version = versions.get(h3_short, EMPTY_CELL_VERSION)
+            cached_version = street_network_cache.read_edge_cache_version(
+                edge_layer_id, h3_short
+            )
+            if cached_version != version:
+                outdated_cells.append((h3_short, version))
 
-        # Initialize cache
-        street_network_cache = StreetNetworkCache()
+        if not outdated_cells:
+            return []
 
         try:
-            for h3_short in street_network_region_h3_3_cells:
-                if edge_layer_id is not None:
-                    if street_network_cache.edge_cache_exists(edge_layer_id, h3_short):
-                        # Read edge data from cache
-                        edge_df = street_network_cache.read_edge_cache(
-                            edge_layer_id, h3_short
-                        )
-                    else:
-                        if settings.ENVIRONMENT == "dev":
-                            print(
-                                f"Fetching street network edge data for H3_3 cell {h3_short}"
-                            )
-
-                        # Read edge data from database
-                        edge_df = pl.read_database_uri(
-                            query=f"""
-                                SELECT
-                                    edge_id AS id, length_m, length_3857, class_, impedance_slope, impedance_slope_reverse,
-                                    impedance_surface, CAST(coordinates_3857 AS TEXT) AS coordinates_3857, maxspeed_forward,
-                                    maxspeed_backward, source, target, h3_3, h3_6
-                                FROM {street_network_edge_table}
-                                WHERE h3_3 = {h3_short}
-                                AND layer_id = '{str(edge_layer_id)}'
-                            """,
-                            uri=settings.POSTGRES_DATABASE_URI,
-                            schema_overrides=SEGMENT_DATA_SCHEMA,
-                        )
-                        edge_df = edge_df.with_columns(
-                            pl.col("coordinates_3857").str.json_decode()
-                        )
-
-                        # Write edge data into cache
-                        street_network_cache.write_edge_cache(
-                            edge_layer_id, h3_short, edge_df
-                        )
-                    # Update street network edge dictionary and memory usage
-                    street_network_edge[h3_short] = edge_df
-                    street_network_size += edge_df.estimated_size("gb")
-
-                if node_layer_id is not None:
-                    if street_network_cache.node_cache_exists(node_layer_id, h3_short):
-                        # Read node data from cache
-                        node_df = street_network_cache.read_node_cache(
-                            node_layer_id, h3_short
-                        )
-                    else:
-                        if settings.ENVIRONMENT == "dev":
-                            print(
-                                f"Fetching street network node data for H3_3 cell {h3_short}"
-                            )
-
-                        # Read node data from database
-                        node_df = pl.read_database_uri(
-                            query=f"""
-                                SELECT node_id AS id, h3_3, h3_6
-                                FROM {street_network_node_table}
-                                WHERE h3_3 = {h3_short}
-                                AND layer_id = '{str(node_layer_id)}'
-                            """,
-                            uri=settings.POSTGRES_DATABASE_URI,
-                            schema_overrides=CONNECTOR_DATA_SCHEMA,
-                        )
-
-                        # Write node data into cache
-                        street_network_cache.write_node_cache(
-                            node_layer_id, h3_short, node_df
-                        )
-
-                    # Update street network node dictionary and memory usage
-                    street_network_node[h3_short] = node_df
-                    street_network_size += node_df.estimated_size("gb")
+            edge_dfs = self.fetch_edge_cells(
+                edge_layer_id, edge_table, [h3_short for h3_short, _ in outdated_cells]
+            )
         except Exception as e:
             raise RuntimeError(
-                f"Failed to fetch street network data from database, error: {e}"
+                f"Failed to refresh street network data from database, error: {e}"
             )
 
-        # Raise error if a edge layer project ID is specified but no edge data is fetched
-        if edge_layer_id is not None and len(street_network_edge) == 0:
-            raise RuntimeError(
-                f"Failed to fetch street network edge data for layer project ID {edge_layer_id}."
-            )
+        for h3_short, version in outdated_cells:
+            with street_network_cache.lock_cell(edge_layer_id, h3_short, "edge"):
+                # Skip cells already refreshed by another process in the meantime
+                cached_version = street_network_cache.read_edge_cache_version(
+                    edge_layer_id, h3_short
+                )
+                if cached_version == version:
+                    continue
+                street_network_cache.write_edge_cache(
+                    edge_layer_id, h3_short, edge_dfs[h3_short], version
+                )
 
-        # Raise error if a node layer project ID is specified but no node data is fetched
-        if node_layer_id is not None and len(street_network_node) == 0:
-            raise RuntimeError(
-                f"Failed to fetch street network node data for layer project ID {node_layer_id}."
-            )
+        return [h3_short for h3_short, _ in outdated_cells]
 
-        end_time = time.time()
+    async def fetch_lazy(
+        self,
+        edge_layer_id: UUID,
+        region_geofence_table: str,
+        redis: Redis | None = None,
+    ) -> StreetNetworkCellManager:
+        """Prepare the street network of the specified layer for on-demand loading,
+        H3_3 cells are only loaded once they are accessed.
+
+        If a Redis client is specified, load metrics are published to it.
+        """
+
+        # Get H3_3 cells covering the street network region
+        street_network_region_h3_3_cells = (
+            await self._get_street_network_region_h3_3_cells(region_geofence_table)
+        )
 
-        print(f"Street network load time: {round((end_time - start_time) / 60, 1)} min")
-        print(f"Street network in-memory size: {round(street_network_size, 1)} GB")
+        # Get table name of the edge table
+        street_network_edge_table, _ = await self._get_street_network_tables(
+            edge_layer_id, None
+        )
+        if street_network_edge_table is None:
+            raise ValueError(
+                f"Could not fetch edge table for layer ID {edge_layer_id}."
+            )
 
-        return street_network_edge, street_network_node
+        return StreetNetworkCellManager(
+            self,
+            edge_layer_id,
+            street_network_edge_table,
+            street_network_region_h3_3_cells,
+            metrics=(
+                StreetNetworkMetrics(redis, edge_layer_id)
+                if redis is not None
+                else None
+            ),
+        )
@@ -0,0 +1,106 @@
+from typing import TypeVar
+
+import polars as pl
+from routing.schemas.catchment_area import (
+    SEGMENT_CLASSES,
+    VALID_BICYCLE_CLASSES,
+    VALID_CAR_CLASSES,
+    VALID_WALKING_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility,
+    CatchmentAreaRoutingTypeCar,
+)
+
+# Segment classes which may be traversed by each routing mode
+VALID_SEGMENT_CLASSES = {
+    CatchmentAreaRoutingTypeActiveMobility.walking.value: VALID_WALKING_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility.bicycle.value: VALID_BICYCLE_CLASSES,
+    CatchmentAreaRoutingTypeActiveMobility.pedelec.value: VALID_BICYCLE_CLASSES,
+    CatchmentAreaRoutingTypeCar.car.value: VALID_CAR_CLASSES,
+}
+
+# Physical codes of the valid segment classes, filtering on codes avoids string comparisons
+VALID_SEGMENT_CLASS_CODES = {
+    mode: [SEGMENT_CLASSES.index(segment_class) for segment_class in segment_classes]
+    for mode, segment_classes in VALID_SEGMENT_CLASSES.items()
+}
+
+# Network variants are built from eager or lazy frames alike
+FrameT = TypeVar("FrameT", pl.DataFrame, pl.LazyFrame)
+
+# Columns retained in a mode-specific network variant
+NETWORK_VARIANT_COLUMNS = [
+    "id",
+    "source",
+    "target",
+    "length_m",
+    "coordinates_3857",
+    "h3_6",
+    "cost",
+    "reverse_cost",
+]
+
+
+def compute_unit_cost(mode: str) -> tuple[pl.Expr, pl.Expr]:
+    """Get expressions for the forward & reverse unit cost of segments for a routing mode.
+
+    Active mobility costs are impedance-weighted lengths in meters, they are scaled by
+    the requested speed during the search. Car costs are travel times in seconds.
+    """
+
+    # Cyclists walk their bicycle / pedelec on pedestrian segments
+    is_rideable = (pl.col("class_") != "pedestrian") & (pl.col("class_") != "crosswalk")
+    impedance_surface = pl.col("impedance_surface").fill_null(0)
+
+    if mode == CatchmentAreaRoutingTypeActiveMobility.walking.value:
+        return pl.col("length_m"), pl.col("length_m")
+    elif mode == CatchmentAreaRoutingTypeActiveMobility.bicycle.value:
+        return (
+            pl.when(is_rideable)
+            .then(
+                pl.col("length_m") * (1 + pl.col("impedance_slope") + impedance_surface)
+            )
+            .otherwise(pl.col("length_m")),
+            pl.when(is_rideable)
+            .then(
+                pl.col("length_m")
+                * (1 + pl.col("impedance_slope_reverse") + impedance_surface)
+            )
+            .otherwise(pl.col("length_m")),
+        )
+    elif mode == CatchmentAreaRoutingTypeActiveMobility.pedelec.value:
+        cost = (
+            pl.when(is_rideable)
+            .then(pl.col("length_m") * (1 + impedance_surface))
+            .otherwise(pl.col("length_m"))
+        )
+        return cost, cost
+    elif mode == CatchmentAreaRoutingTypeCar.car.value:
+        # Segments without a backward speed are one-way, their reverse cost is null
+        return (
+            pl.col("length_m") / ((pl.col("maxspeed_forward") * 0.7) / 3.6),
+            pl.col("length_m") / ((pl.col("maxspeed_backward") * 0.7) / 3.6),
+        )
+    else:
+        raise ValueError(f"Unsupported routing mode {mode}.")
+
+
+def build_network_variant(
+    edge_df: FrameT, mode: str, filter_classes: bool = True
+) -> FrameT:
+    """Build the network variant of a routing mode, containing only its valid segments,
+    the columns required for routing and precomputed unit costs."""
+
+    cost, reverse_cost = compute_unit_cost(mode)
+    if filter_classes:
+        edge_df = edge_df.filter(
+            pl.col("class_").to_physical().is_in(VALID_SEGMENT_CLASS_CODES[mode])
+        )
+    return edge_df.select(
+        *[
+            column
+            for column in NETWORK_VARIANT_COLUMNS
+            if column not in ("cost", "reverse_cost")
+        ],
+        cost.cast(pl.Float64).alias("cost"),
+        reverse_cost.cast(pl.Float64).alias("reverse_cost"),
+    )
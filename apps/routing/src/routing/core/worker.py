@@ -32,3 +32,11 @@ def run_catchment_area(params: Any) -> str:
     coroutine = crud_catchment_area.run(params)
     loop.run_until_complete(coroutine)
     return "OK"
+
+
+@celery_app.task  # type: ignore
+def refresh_street_network() -> str:
+    loop = asyncio.get_event_loop()
+    coroutine = crud_catchment_area.refresh_routing_network()
+    loop.run_until_complete(coroutine)
+    return "OK"
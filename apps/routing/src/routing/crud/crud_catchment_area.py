@@ -3,22 +3,42 @@
 
 import math
 import time
-import uuid
+from collections import OrderedDict
 from typing import Any
+from uuid import UUID
 
 import numpy as np
 import polars as pl
 from redis import Redis
 from routing.core.config import settings
+from routing.core.coordinate_transform import wgs84_to_web_mercator
+from routing.core.h3_coverage import (
+    get_h3_10_grid_disks,
+    get_h3_10_grid_radius,
+    get_h3_6_coverage,
+    get_origin_cells,
+    merge_h3_10_grid_disks,
+)
 from routing.core.isochrone import compute_isochrone, compute_isochrone_h3
 from routing.core.jsoline import generate_jsolines
-from routing.core.street_network.street_network_util import StreetNetworkUtil
+from routing.core.street_network.street_network_cell_manager import (
+    StreetNetworkCellManager,
+)
+from routing.core.street_network.street_network_cache import StreetNetworkCache
+from routing.core.street_network.street_network_geometry import flatten_coordinates
+from routing.core.street_network.street_network_snapping import (
+    SegmentIndex,
+    snap_points,
+)
+from routing.core.street_network.street_network_util import (
+    StreetNetworkUtil,
+    read_segment_rows,
+    to_segment_schema,
+)
+from routing.core.street_network.street_network_variant import (
+    build_network_variant,
+)
 from routing.schemas.catchment_area import (
-    SEGMENT_DATA_SCHEMA,
-    VALID_BICYCLE_CLASSES,
-    VALID_CAR_CLASSES,
-    VALID_WALKING_CLASSES,
-    CatchmentAreaRoutingTypeActiveMobility,
     CatchmentAreaRoutingTypeCar,
     CatchmentAreaTravelTimeCostActiveMobility,
     CatchmentAreaTravelTimeCostMotorizedMobility,
@@ -37,25 +57,31 @@ class CRUDCatchmentArea:
         self.db_connection = db_connection
         self.redis = redis
         self.routing_network = None
+        self.street_network_cache = StreetNetworkCache()
+        # Network modifications of recently used scenario versions, ordered from least
+        # to most recently used
+        self.scenario_modifications: OrderedDict[tuple, pl.DataFrame] = OrderedDict()
+        # H3_10 grid disks of recently used origin cells & radii, ordered from least to
+        # most recently used
+        self.h3_10_grid_disks: OrderedDict[tuple[str, int], tuple] = OrderedDict()
+        self.h3_10_grid_disk_cells = 0
 
     async def read_network(
         self,
-        routing_network: dict,
+        routing_network: StreetNetworkCellManager,
         obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar,
-        input_table: str,
-        num_points: int,
+        compare_to_base: bool = False,
     ) -> Any:
-        """Read relevant sub-network for catchment area calculation from polars dataframe."""
-
-        # Get valid segment classes based on transport mode
-        if type(obj_in) is ICatchmentAreaActiveMobility:
-            valid_segment_classes = (
-                VALID_WALKING_CLASSES
-                if obj_in.routing_type == "walking"
-                else VALID_BICYCLE_CLASSES
-            )
-        else:
-            valid_segment_classes = VALID_CAR_CLASSES
+        """Read relevant sub-network for catchment area calculation from polars dataframe.
+
+        If compared to the base network, the sub-network additionally holds a mask of
+        segments which don't exist in the base network.
+        """
+
+        # Network variants of the transport mode only contain its valid segment classes
+        mode = obj_in.routing_type.value
+        latitudes = obj_in.starting_points.latitude
+        longitudes = obj_in.starting_points.longitude
 
         # Compute buffer distance for identifying relevant H3_6 cells
         if type(obj_in.travel_cost) is CatchmentAreaTravelTimeCostActiveMobility:
@@ -70,369 +96,258 @@ class CRUDCatchmentArea:
             buffer_dist = obj_in.travel_cost.max_distance
 
         # Identify H3_3 & H3_6 cells relevant to this catchment area calculation
-        h3_3_cells = set()
-        h3_6_cells = set()
-
-        sql_get_relevant_cells = text(
-            f"""
-            WITH point AS (
-                SELECT geom FROM "{input_table}" LIMIT {num_points}
-            ),
-            buffer AS (
-                SELECT ST_Buffer(point.geom::geography, {buffer_dist})::geometry AS geom
-                FROM point
-            ),
-            cells AS (
-                SELECT
-                    basic.to_short_h3_6(h3_index::bigint) AS h3_6,
-                    basic.to_short_h3_3(h3_lat_lng_to_cell(ST_Centroid(h3_geom)::point, 3)::bigint) AS h3_3
-                FROM buffer,
-                LATERAL basic.fill_polygon_h3_6(buffer.geom)
-            )
-            SELECT h3_3, ARRAY_AGG(h3_6) AS h3_6
-            FROM cells
-            GROUP BY h3_3;
-        """
-        )
-        result = (await self.db_connection.execute(sql_get_relevant_cells)).fetchall()
-
-        for h3_3_cell in result:
-            h3_3_cells.add(h3_3_cell[0])
-            for h3_6_cell in h3_3_cell[1]:
-                h3_6_cells.add(h3_6_cell)
-
-        # Get relevant segments & connectors
-        sub_network = pl.DataFrame()
-        for h3_3 in h3_3_cells:
-            sub_df = routing_network.get(h3_3)
-
+        h3_3_cells, h3_6_cells = get_h3_6_coverage(latitudes, longitudes, buffer_dist)
+
+        # Get relevant segments & connectors, the sub-network is assembled as a single lazy
+        # query plan over all cells which is collected once
+        cell_networks = []
+        h3_6_filter = pl.col("h3_6").is_in(list(h3_6_cells))
+        # Network variants only contain valid segment classes and unit costs of the mode
+        for sub_df in routing_network.get_cells(list(h3_3_cells), mode=mode).values():
             if sub_df is None:
                 raise BufferExceedsNetworkError(
                     "Catchment area buffer exceeds available H3_3 network cells."
                 )
 
-            sub_df = sub_df.filter(
-                pl.col("h3_6").is_in(h3_6_cells)
-                & pl.col("class_").is_in(valid_segment_classes)
-            )
-            if sub_network.width > 0:
-                sub_network.extend(sub_df)
-            else:
-                sub_network = sub_df
+            # Keep segments of relevant H3_6 cells, the predicate is pushed down into lazy
+            # scans of the cache files
+            cell_networks.append(sub_df.lazy().filter(h3_6_filter))
+
+        # Segments added by the scenario & artificial segments, and IDs of segments they replace
+        added_segments = []
+        segments_to_discard = []
+        scenario_segments = None
 
-        # Produce all network modifications required to apply the specified scenario
-        network_modifications_table = None
         if obj_in.scenario_id:
-            sql_produce_network_modifications = text(
-                f"""
-                    SELECT basic.produce_network_modifications(
-                        {format_value_null_sql(obj_in.scenario_id)},
-                        {obj_in.street_network.edge_layer_project_id},
-                        {obj_in.street_network.node_layer_project_id}
-                    );
-                """
+            # Apply network modifications of the scenario to the sub-network
+            modifications = await self.get_scenario_modifications(obj_in)
+
+            # Deleted segments are discarded, modified segments are discarded and re-added
+            segments_to_discard.extend(
+                modifications.filter(pl.col("edit_type") == "d")
+                .get_column("id")
+                .to_list()
             )
-            network_modifications_table = (
-                await self.db_connection.execute(sql_produce_network_modifications)
-            ).fetchone()[0]
-
-        if network_modifications_table:
-            # Apply network modifications to the sub-network
-            segments_to_discard = []
-            sql_get_network_modifications = text(
-                f"""
-                SELECT edit_type, id, class_, source, target,
-                    length_m, length_3857, CAST(coordinates_3857 AS TEXT) AS coordinates_3857,
-                    impedance_slope, impedance_slope_reverse, impedance_surface, maxspeed_forward,
-                    maxspeed_backward, h3_6, h3_3
-                FROM "{network_modifications_table}";
-            """
+            scenario_segments = build_network_variant(
+                to_segment_schema(modifications.filter(pl.col("edit_type") != "d")),
+                mode,
+                filter_classes=False,
             )
-            result = (
-                await self.db_connection.execute(sql_get_network_modifications)
-            ).fetchall()
-
-            for modification in result:
-                if modification[0] == "d":
-                    segments_to_discard.append(modification[1])
-                    continue
-
-                new_segment = pl.DataFrame(
-                    [
-                        {
-                            "id": modification[1],
-                            "length_m": modification[5],
-                            "length_3857": modification[6],
-                            "class_": modification[2],
-                            "impedance_slope": modification[8],
-                            "impedance_slope_reverse": modification[9],
-                            "impedance_surface": modification[10],
-                            "coordinates_3857": modification[7],
-                            "maxspeed_forward": modification[11],
-                            "maxspeed_backward": modification[12],
-                            "source": modification[3],
-                            "target": modification[4],
-                            "h3_3": modification[13],
-                            "h3_6": modification[14],
-                        }
-                    ],
-                    schema_overrides=SEGMENT_DATA_SCHEMA,
-                )
-                new_segment = new_segment.with_columns(
-                    pl.col("coordinates_3857").str.json_extract()
-                )
-                sub_network.extend(new_segment)
-
-            # Remove segments which are deleted or modified due to the scenario
-            sub_network = sub_network.filter(~pl.col("id").is_in(segments_to_discard))
+            added_segments.append(scenario_segments)
 
-        # Create necessary artifical segments and add them to our sub network
-        origin_point_connectors = []
-        origin_point_cell_index = []
-        origin_point_h3_3 = []
-        segments_to_discard = []
-        sql_get_artificial_segments = text(
-            f"""
-            SELECT
-                point_id,
-                old_id,
-                id, length_m, length_3857, class_, impedance_slope,
-                impedance_slope_reverse, impedance_surface,
-                CAST(coordinates_3857 AS TEXT) AS coordinates_3857,
-                maxspeed_forward, maxspeed_backward, source, target,
-                h3_3, h3_6, point_cell_index, point_h3_3
-            FROM basic.get_artificial_segments(
-                {format_value_null_sql(settings.BASE_STREET_NETWORK)},
-                {format_value_null_sql(network_modifications_table)},
-                {format_value_null_sql(input_table)},
-                {num_points},
-                '{",".join(valid_segment_classes)}',
-                10
-            );
-        """
+        # Spatial indexes over segments within snapping distance of the origin points
+        snap_h3_3_cells, _ = get_h3_6_coverage(
+            latitudes, longitudes, settings.CATCHMENT_AREA_SNAP_DISTANCE
         )
-        result = (
-            await self.db_connection.execute(sql_get_artificial_segments)
-        ).fetchall()  # TODO Check if artificial segments are even required for car routing
-        for a_seg in result:
-            if a_seg[0] is not None:
-                origin_point_connectors.append(a_seg[12])
-                origin_point_cell_index.append(a_seg[16])
-                origin_point_h3_3.append(a_seg[17])
-                segments_to_discard.append(a_seg[1])
-
-            new_df = pl.DataFrame(
-                [
-                    {
-                        "id": a_seg[2],
-                        "length_m": a_seg[3],
-                        "length_3857": a_seg[4],
-                        "class_": a_seg[5],
-                        "impedance_slope": a_seg[6],
-                        "impedance_slope_reverse": a_seg[7],
-                        "impedance_surface": a_seg[8],
-                        "coordinates_3857": a_seg[9],
-                        "maxspeed_forward": a_seg[10],
-                        "maxspeed_backward": a_seg[11],
-                        "source": a_seg[12],
-                        "target": a_seg[13],
-                        "h3_3": a_seg[14],
-                        "h3_6": a_seg[15],
-                    }
+        segment_indexes = []
+        for h3_3 in snap_h3_3_cells:
+            segment_index = routing_network.get_segment_index(h3_3, mode)
+            if segment_index is not None:
+                segment_indexes.append(segment_index)
+        if scenario_segments is not None and scenario_segments.height > 0:
+            segment_indexes.append(SegmentIndex(scenario_segments))
+
+        # Snap origin points to their nearest segment and split segments at them into
+        # artificial segments, snapping distances are scaled to web mercator
+        artificial_segments, replaced_ids, snapped_points = snap_points(
+            segment_indexes,
+            wgs84_to_web_mercator(np.column_stack((longitudes, latitudes))),
+            settings.CATCHMENT_AREA_SNAP_DISTANCE / np.cos(np.radians(latitudes)),
+            segments_to_discard,
+        )
+        added_segments.append(artificial_segments)
+        segments_to_discard.extend(replaced_ids)
+
+        # The base network shares the origin points' artificial segments, it discards
+        # segments added by the scenario and artificial segments split from them
+        base_segments_to_discard = None
+        if compare_to_base and scenario_segments is not None:
+            scenario_ids = set(scenario_segments.get_column("id").to_list())
+            base_segments_to_discard = [
+                *scenario_ids,
+                *replaced_ids,
+                *[
+                    artificial_id
+                    for artificial_id, replaced_id in zip(
+                        artificial_segments.get_column("id").to_list(), replaced_ids
+                    )
+                    if replaced_id in scenario_ids
                 ],
-                schema_overrides=SEGMENT_DATA_SCHEMA,
-            )
-            new_df = new_df.with_columns(pl.col("coordinates_3857").str.json_extract())
-            sub_network.extend(new_df)
+            ]
+
+        # Each snapped origin point is connected to the network by its own connector
+        origin_point_connectors = [-(i + 1) for i in snapped_points]
+        origin_point_cell_index, origin_point_h3_3 = get_origin_cells(
+            [latitudes[i] for i in snapped_points],
+            [longitudes[i] for i in snapped_points],
+        )
 
         if len(origin_point_connectors) == 0:
             raise DisconnectedOriginError(
                 "Starting point(s) are disconnected from the street network."
             )
 
-        # Remove segments which are replaced by artificial segments or modified due to the scenario
-        sub_network = sub_network.filter(~pl.col("id").is_in(segments_to_discard))
-
-        # Replace all NULL values in the impedance columns with 0
-        sub_network = sub_network.with_columns(pl.col("impedance_surface").fill_null(0))
+        sub_network = pl.concat(cell_networks, parallel=True)
+
+        # Scenario modifications & artificial segments are applied as an overlay on the base
+        # network, added segments are appended and replaced segments are masked as deleted
+        # rather than filtered out, so the base network is never rewritten
+        sub_network = pl.concat(
+            [sub_network, *[segment.lazy() for segment in added_segments]],
+            parallel=True,
+        ).with_columns(
+            pl.col("id")
+            .is_in(pl.Series(segments_to_discard, dtype=pl.Int64))
+            .alias("deleted"),
+            (
+                pl.col("id").is_in(pl.Series(base_segments_to_discard, dtype=pl.Int64))
+                if base_segments_to_discard is not None
+                else pl.lit(False)
+            ).alias("base_deleted"),
+        )
 
-        # Compute cost for each segment
-        if type(obj_in.travel_cost) in [
+        # Network variants hold unit costs which are scaled by the requested speed during
+        # the search, distance based catchment areas use the segment length as cost
+        if type(obj_in.travel_cost) not in [
             CatchmentAreaTravelTimeCostActiveMobility,
             CatchmentAreaTravelTimeCostMotorizedMobility,
         ]:
-            # If producing a travel time cost based catchment area, compute segment cost accordingly
-            sub_network = self.compute_segment_cost(
-                sub_network=sub_network,
-                mode=obj_in.routing_type,
-                speed=(
-                    obj_in.travel_cost.speed / 3.6
-                    if type(obj_in.travel_cost)
-                    is CatchmentAreaTravelTimeCostActiveMobility
-                    else None
-                ),
-            )
-        else:
-            # TODO: Refactor this into a separate function as slope / surface impedance should be included
-            # for bicycle / pedelec routing and one-ways should be avoided for car routing
-            # If producing a distance cost based catchment area, use the segment length as cost
             sub_network = sub_network.with_columns(
                 pl.col("length_m").alias("cost"),
                 pl.col("length_m").alias("reverse_cost"),
             )
 
-        # Select columns required for computing catchment area and convert to dictionary of numpy arrays
+        sub_network = sub_network.select(
+            "id",
+            "source",
+            "target",
+            "cost",
+            "reverse_cost",
+            "coordinates_3857",
+            "deleted",
+            "base_deleted",
+        ).collect()
+
+        # Convert to dictionary of contiguous numpy arrays, numeric columns of a single chunk
+        # are zero-copy views, except for source & target which are remapped in place
+        geom_address, geom_array = flatten_coordinates(
+            sub_network.get_column("coordinates_3857")
+        )
         sub_network = {
-            "id": sub_network.get_column("id").to_numpy().copy(),
-            "source": sub_network.get_column("source").to_numpy().copy(),
-            "target": sub_network.get_column("target").to_numpy().copy(),
-            "cost": sub_network.get_column("cost").to_numpy().copy(),
-            "reverse_cost": sub_network.get_column("reverse_cost").to_numpy().copy(),
-            "length": sub_network.get_column("length_3857").to_numpy().copy(),
-            "geom": sub_network.get_column("coordinates_3857").to_numpy().copy(),
+            "id": sub_network.get_column("id").to_numpy(),
+            "source": sub_network.get_column("source").to_numpy(writable=True),
+            "target": sub_network.get_column("target").to_numpy(writable=True),
+            "cost": sub_network.get_column("cost").to_numpy(),
+            "reverse_cost": sub_network.get_column("reverse_cost").to_numpy(),
+            "geom_address": geom_address,
+            "geom_array": geom_array,
+            "deleted": sub_network.get_column("deleted").to_numpy(),
+            "base_deleted": sub_network.get_column("base_deleted").to_numpy()
+            if base_segments_to_discard is not None
+            else None,
         }
 
         return (
             sub_network,
-            network_modifications_table,
             origin_point_connectors,
             origin_point_cell_index,
             origin_point_h3_3,
         )
 
-    async def create_input_table(self, obj_in):
-        """Create the input table for the catchment area calculation."""
+    async def get_scenario_version(
+        self, scenario_id: UUID, edge_layer_project_id: int
+    ) -> str:
+        """Get the version of a scenario's features, it changes whenever a feature of the
+        street network layer is added, edited or removed."""
 
-        # Generate random table name
-        table_name = f"temporal.{str(uuid.uuid4()).replace('-', '_')}"
+        sql_get_scenario_version = text(
+            f"""
+            SELECT COUNT(sf.id)::text || '-' || COALESCE(SUM(hashtext(sf::text)::bigint), 0)::text
+            FROM {settings.CUSTOMER_SCHEMA}.scenario_scenario_feature ssf
+            JOIN {settings.CUSTOMER_SCHEMA}.scenario_feature sf ON sf.id = ssf.scenario_feature_id
+            WHERE ssf.scenario_id = '{str(scenario_id)}'
+            AND sf.layer_project_id = {edge_layer_project_id};
+        """
+        )
+        result = await self.db_connection.execute(sql_get_scenario_version)
+        return result.fetchone()[0]
+
+    async def get_scenario_modifications(
+        self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar
+    ) -> pl.DataFrame:
+        """Get network modifications required to apply a scenario, cached per scenario
+        version in memory and on disk."""
+
+        edge_layer_project_id = obj_in.street_network.edge_layer_project_id
+        node_layer_project_id = obj_in.street_network.node_layer_project_id
+        version = await self.get_scenario_version(
+            obj_in.scenario_id, edge_layer_project_id
+        )
 
-        # Create temporary table for storing catchment area starting points
-        await self.db_connection.execute(
-            text(
-                f"""
-                CREATE TABLE "{table_name}" (
-                    id serial PRIMARY KEY,
-                    geom geometry(Point, 4326)
-                );
-            """
-            )
+        key = (
+            str(obj_in.scenario_id),
+            edge_layer_project_id,
+            node_layer_project_id,
+            version,
         )
+        modifications = self.scenario_modifications.get(key)
+        if modifications is not None:
+            self.scenario_modifications.move_to_end(key)
+            return modifications
 
-        # Insert catchment area starting points into the temporary table
-        insert_string = ""
-        for i in range(len(obj_in.starting_points.latitude)):
-            latitude = obj_in.starting_points.latitude[i]
-            longitude = obj_in.starting_points.longitude[i]
-            insert_string += (
-                f"(ST_SetSRID(ST_MakePoint({longitude}, {latitude}), 4326)),"
+        modifications = self.street_network_cache.read_scenario_cache(
+            obj_in.scenario_id, edge_layer_project_id, node_layer_project_id, version
+        )
+        if modifications is None:
+            # Produce network modifications of the scenario in the database
+            sql_produce_network_modifications = text(
+                f"""
+                    SELECT basic.produce_network_modifications(
+                        {format_value_null_sql(obj_in.scenario_id)},
+                        {edge_layer_project_id},
+                        {node_layer_project_id}
+                    );
+                """
             )
-        await self.db_connection.execute(
-            text(
+            network_modifications_table = (
+                await self.db_connection.execute(sql_produce_network_modifications)
+            ).fetchone()[0]
+
+            sql_get_network_modifications = text(
                 f"""
-                INSERT INTO "{table_name}" (geom)
-                VALUES {insert_string.rstrip(",")};
+                SELECT edit_type, id, class_, source, target,
+                    length_m, length_3857, CAST(coordinates_3857 AS TEXT) AS coordinates_3857,
+                    impedance_slope, impedance_slope_reverse, impedance_surface, maxspeed_forward,
+                    maxspeed_backward, h3_6, h3_3
+                FROM "{network_modifications_table}";
             """
             )
-        )
-
-        await self.db_connection.commit()
+            result = await self.db_connection.execute(sql_get_network_modifications)
+            modifications = read_segment_rows(list(result.keys()), result.fetchall())
 
-        return table_name, len(obj_in.starting_points.latitude)
-
-    async def drop_temp_tables(
-        self, input_table: str, network_modifications_table: str
-    ):
-        """Delete the temporary input and network modifications tables."""
-
-        await self.db_connection.execute(text(f'DROP TABLE "{input_table}";'))
-        if network_modifications_table is not None:
             await self.db_connection.execute(
                 text(f'DROP TABLE "{network_modifications_table}";')
             )
-        await self.db_connection.commit()
-
-    def compute_segment_cost(self, sub_network, mode, speed):
-        """Compute the cost of a segment based on the mode, speed, impedance, etc."""
+            await self.db_connection.commit()
 
-        if mode == CatchmentAreaRoutingTypeActiveMobility.walking:
-            return sub_network.with_columns(
-                (pl.col("length_m") / speed).alias("cost"),
-                (pl.col("length_m") / speed).alias("reverse_cost"),
-            )
-        elif mode == CatchmentAreaRoutingTypeActiveMobility.bicycle:
-            return sub_network.with_columns(
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then(
-                    (
-                        pl.col("length_m")
-                        * (1 + pl.col("impedance_slope") + pl.col("impedance_surface"))
-                    )
-                    / speed
-                )
-                .otherwise(
-                    pl.col("length_m") / speed
-                )  # This calculation is invoked when the segment class requires cyclists to walk their bicycle
-                .alias("cost"),
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then(
-                    (
-                        pl.col("length_m")
-                        * (
-                            1
-                            + pl.col("impedance_slope_reverse")
-                            + pl.col("impedance_surface")
-                        )
-                    )
-                    / speed
-                )
-                .otherwise(
-                    pl.col("length_m") / speed
-                )  # This calculation is invoked when the segment class requires cyclists to walk their bicycle
-                .alias("reverse_cost"),
-            )
-        elif mode == CatchmentAreaRoutingTypeActiveMobility.pedelec:
-            return sub_network.with_columns(
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then((pl.col("length_m") * (1 + pl.col("impedance_surface"))) / speed)
-                .otherwise(
-                    pl.col("length_m") / speed
-                )  # This calculation is invoked when the segment class requires cyclists to walk their pedelec
-                .alias("cost"),
-                pl.when(
-                    (pl.col("class_") != "pedestrian")
-                    & (pl.col("class_") != "crosswalk")
-                )
-                .then((pl.col("length_m") * (1 + pl.col("impedance_surface"))) / speed)
-                .otherwise(
-                    pl.col("length_m") / speed
-                )  # This calculation is invoked when the segment class requires cyclists to walk their pedelec
-                .alias("reverse_cost"),
+            self.street_network_cache.write_scenario_cache(
+                obj_in.scenario_id,
+                edge_layer_project_id,
+                node_layer_project_id,
+                version,
+                modifications,
             )
-        elif mode == CatchmentAreaRoutingTypeCar.car:
-            return sub_network.with_columns(
-                (pl.col("length_m") / ((pl.col("maxspeed_forward") * 0.7) / 3.6)).alias(
-                    "cost"
-                ),
-                pl.when(pl.col("maxspeed_backward") is not None)
-                .then(pl.col("length_m") / ((pl.col("maxspeed_backward") * 0.7) / 3.6))
-                .otherwise(
-                    99999
-                )  # This is a one-way segment, so assign a very high cost to the reverse direction
-                .alias("reverse_cost"),
-            )
-        else:
-            return None
 
-    async def get_h3_10_grid(self, db_connection, obj_in, origin_h3_10: str):
+        self.scenario_modifications[key] = modifications
+        while (
+            len(self.scenario_modifications)
+            > settings.SCENARIO_MODIFICATIONS_CACHE_SIZE
+        ):
+            self.scenario_modifications.popitem(last=False)
+
+        return modifications
+
+    def get_h3_10_grid(self, obj_in, origin_h3_10: list[str]):
         """Get H3_10 cell grid required for computing a grid-type catchment area."""
 
         # Compute buffer distance for identifying relevant H3_10 cells
@@ -447,47 +362,118 @@ class CRUDCatchmentArea:
         else:
             buffer_dist = obj_in.travel_cost.max_distance
 
-        # Fetch H3_10 cell grid relevant to the catchment area calculation
-        sql_get_relevant_cells = text(
-            f"""
-            WITH cells AS (
-                SELECT DISTINCT(h3_grid_disk(sub.origin_h3_index, radius.value)) AS h3_index
-                FROM (SELECT UNNEST(ARRAY{origin_h3_10}::h3index[]) AS origin_h3_index) sub,
-                LATERAL (SELECT ({buffer_dist}::int / (h3_get_hexagon_edge_length_avg(10, 'm') * 1.5)::int) AS value) AS radius
-            )
-            SELECT h3_index, ST_X(centroid), ST_Y(centroid)
-            FROM cells,
-            LATERAL (
-                SELECT ST_Transform(ST_SetSRID(point::geometry, 4326), 3857) AS centroid
-                FROM h3_cell_to_lat_lng(h3_index) AS point
-            ) sub;
-        """
-        )
-        result = (await db_connection.execute(sql_get_relevant_cells)).fetchall()
+        # Compute H3_10 cell grid relevant to the catchment area calculation, grid disks
+        # are cached per origin cell as popular origins repeat
+        radius = get_h3_10_grid_radius(buffer_dist)
+        origin_h3_10 = list(dict.fromkeys(origin_h3_10))
+        missing_h3_10 = [
+            h3_10
+            for h3_10 in origin_h3_10
+            if (h3_10, radius) not in self.h3_10_grid_disks
+        ]
+        if missing_h3_10:
+            for h3_10, disk in zip(
+                missing_h3_10, get_h3_10_grid_disks(missing_h3_10, radius)
+            ):
+                self.h3_10_grid_disks[(h3_10, radius)] = disk
+                self.h3_10_grid_disk_cells += len(disk[0])
 
-        h3_index = []
-        x_centroids = np.empty(len(result))
-        y_centroids = np.empty(len(result))
-        for i in range(len(result)):
-            h3_index.append(result[i][0])
-            x_centroids[i] = result[i][1]
-            y_centroids[i] = result[i][2]
+        disks = []
+        for h3_10 in origin_h3_10:
+            self.h3_10_grid_disks.move_to_end((h3_10, radius))
+            disks.append(self.h3_10_grid_disks[(h3_10, radius)])
 
-        return h3_index, x_centroids, y_centroids
+        # Evict least recently used grid disks, except for those of this request
+        while self.h3_10_grid_disk_cells > settings.H3_10_GRID_CACHE_CELLS and len(
+            self.h3_10_grid_disks
+        ) > len(origin_h3_10):
+            _, disk = self.h3_10_grid_disks.popitem(last=False)
+            self.h3_10_grid_disk_cells -= len(disk[0])
 
-    async def save_result(self, obj_in, shapes, network, grid_index, grid):
-        """Save the result of the catchment area computation to the database."""
+        return merge_h3_10_grid_disks(disks)
 
-        if obj_in.catchment_area_type == "polygon":
-            # Save catchment area geometry data (shapes)
-            shapes = shapes["full"]
+    def get_shapes_query(self, shapes):
+        """Get a query selecting the geometry & minute of catchment area shapes."""
+
+        shapes = shapes["full"]
 
-            insert_string = ""
-            for i in shapes.index:
-                geom = shapes["geometry"][i]
-                minute = shapes["minute"][i]
-                insert_string += f"SELECT ST_MakeValid(ST_SetSRID(ST_GeomFromText('{geom}'), 4326)) AS geom, {minute} AS minute UNION ALL "
-            insert_string, _, _ = insert_string.rpartition(" UNION ALL ")
+        insert_string = ""
+        for i in shapes.index:
+            geom = shapes["geometry"][i]
+            minute = shapes["minute"][i]
+            insert_string += f"SELECT ST_MakeValid(ST_SetSRID(ST_GeomFromText('{geom}'), 4326)) AS geom, {minute} AS minute UNION ALL "
+        insert_string, _, _ = insert_string.rpartition(" UNION ALL ")
+        return insert_string
+
+    async def save_result(
+        self,
+        obj_in,
+        shapes,
+        network,
+        grid_index,
+        grid,
+        base_shapes=None,
+        base_grid=None,
+    ):
+        """Save the result of the catchment area computation to the database.
+
+        If compared to the base network, gained & lost areas are saved for polygons,
+        networks hold the base network's cost alongside the scenario's and grids
+        additionally hold the travel cost saved by the scenario.
+        """
+
+        if obj_in.catchment_area_type == "polygon" and obj_in.compare_to_base:
+            # Save areas gained & lost by the scenario for each step, differences are
+            # computed between the full (not incremental) shapes of both networks
+            sql_insert_into_table = text(
+                f"""
+                WITH isochrones AS
+                (
+                    SELECT 'scenario' AS network, p."minute", (ST_DUMP(p.geom)).geom
+                    FROM (
+                        {self.get_shapes_query(shapes)}
+                    ) p
+                    UNION ALL
+                    SELECT 'base' AS network, p."minute", (ST_DUMP(p.geom)).geom
+                    FROM (
+                        {self.get_shapes_query(base_shapes)}
+                    ) p
+                ),
+                isochrones_filled AS
+                (
+                    SELECT network, "minute", ST_UNION(filled) AS geom
+                    FROM isochrones,
+                    LATERAL basic.fill_polygon_holes(geom, {settings.CATCHMENT_AREA_HOLE_THRESHOLD_SQM}) filled
+                    GROUP BY network, "minute"
+                ),
+                scenario AS
+                (
+                    SELECT "minute", geom FROM isochrones_filled WHERE network = 'scenario'
+                ),
+                base AS
+                (
+                    SELECT "minute", geom FROM isochrones_filled WHERE network = 'base'
+                )
+                INSERT INTO {obj_in.result_table} (layer_id, geom, integer_attr1, text_attr1)
+                SELECT '{obj_in.layer_id}', ST_MakeValid(d.geom), ROUND(COALESCE(s."minute", b."minute")), d.change
+                FROM scenario s
+                FULL JOIN base b ON s."minute" = b."minute",
+                LATERAL
+                (
+                    SELECT 'gained' AS change, COALESCE(ST_DIFFERENCE(s.geom, b.geom), s.geom) AS geom
+                    UNION ALL
+                    SELECT 'lost' AS change, COALESCE(ST_DIFFERENCE(b.geom, s.geom), b.geom) AS geom
+                ) d
+                WHERE d.geom IS NOT NULL
+                AND NOT ST_ISEMPTY(d.geom);
+            """
+            )
+
+            await self.db_connection.execute(sql_insert_into_table)
+            await self.db_connection.commit()
+        elif obj_in.catchment_area_type == "polygon":
+            # Save catchment area geometry data (shapes)
+            insert_string = self.get_shapes_query(shapes)
 
             sql_insert_into_table = text(
                 f"""
@@ -539,18 +525,29 @@ class CRUDCatchmentArea:
                     ),
                 ):
                     coordinates = network["features"][i]["geometry"]["coordinates"]
-                    cost = network["features"][i]["properties"]["cost"]
+                    properties = network["features"][i]["properties"]
                     points_string = ""
                     for pair in coordinates:
                         points_string += f"ST_MakePoint({pair[0]}, {pair[1]}),"
+                    # Segments reached in only one network have no cost in the other
+                    costs_string = ", ".join(
+                        f"ROUND({properties[key]})"
+                        if properties[key] is not None
+                        else "NULL"
+                        for key in (
+                            ("cost", "base_cost")
+                            if obj_in.compare_to_base
+                            else ("cost",)
+                        )
+                    )
                     insert_string += f"""(
                         '{obj_in.layer_id}',
-                        ST_Transform(ST_SetSRID(ST_MakeLine(ARRAY[{points_string.rstrip(',')}]), 3857), 4326),
-                        ROUND({cost})
+                        ST_SetSRID(ST_MakeLine(ARRAY[{points_string.rstrip(',')}]), 4326),
+                        {costs_string}
                     ),"""
                 insert_string = text(
                     f"""
-                    INSERT INTO {obj_in.result_table} (layer_id, geom, integer_attr1)
+                    INSERT INTO {obj_in.result_table} (layer_id, geom, integer_attr1{", integer_attr2" if obj_in.compare_to_base else ""})
                     VALUES {insert_string.rstrip(",")};
                 """
                 )
@@ -566,26 +563,63 @@ class CRUDCatchmentArea:
                     batch_index,
                     min(len(grid_index), batch_index + settings.DATA_INSERT_BATCH_SIZE),
                 ):
-                    if math.isnan(grid[i]):
-                        continue
+                    if obj_in.compare_to_base:
+                        # Cells reached in either network are kept, the difference is
+                        # the travel cost saved by the scenario
+                        if math.isnan(grid[i]) and math.isnan(base_grid[i]):
+                            continue
+                        costs_string = ", ".join(
+                            f"ROUND({value})" if not math.isnan(value) else "NULL"
+                            for value in (grid[i], base_grid[i], base_grid[i] - grid[i])
+                        )
+                    else:
+                        if math.isnan(grid[i]):
+                            continue
+                        costs_string = f"ROUND({grid[i]})"
                     insert_string += f"""(
                         '{obj_in.layer_id}',
                         ST_SetSRID(h3_cell_to_boundary('{grid_index[i]}'::h3index)::geometry, 4326),
                         '{grid_index[i]}',
-                        ROUND({grid[i]})
+                        {costs_string}
                     ),"""
 
                 # Insert only if any grid data was added to the query in this batch
                 if insert_string:
                     insert_string = text(
                         f"""
-                        INSERT INTO {obj_in.result_table} (layer_id, geom, text_attr1, integer_attr1)
+                        INSERT INTO {obj_in.result_table} (layer_id, geom, text_attr1, integer_attr1{", integer_attr2, integer_attr3" if obj_in.compare_to_base else ""})
                         VALUES {insert_string.rstrip(",")};
                     """
                     )
                     await self.db_connection.execute(insert_string)
                     await self.db_connection.commit()
 
+    async def get_routing_network(self) -> StreetNetworkCellManager:
+        """Get the routing network (processed segments), cells are loaded into memory on demand."""
+
+        if self.routing_network is None:
+            self.routing_network = await StreetNetworkUtil(
+                self.db_connection
+            ).fetch_lazy(
+                edge_layer_id=settings.BASE_STREET_NETWORK,
+                region_geofence_table=settings.NETWORK_REGION_TABLE,
+                redis=self.redis,
+            )
+        return self.routing_network
+
+    async def refresh_routing_network(self) -> list[int]:
+        """Re-fetch routing network cells which changed in the database."""
+
+        routing_network = await self.get_routing_network()
+
+        start_time = time.time()
+        refreshed_cells = routing_network.refresh()
+        print(
+            f"Refreshed {len(refreshed_cells)} street network H3_3 cells in {round(time.time() - start_time, 2)} sec"
+        )
+
+        return refreshed_cells
+
     async def run(self, obj_in: ICatchmentAreaActiveMobility | ICatchmentAreaCar):
         """Compute catchment areas for the given request parameters."""
 
@@ -594,14 +628,7 @@ class CRUDCatchmentArea:
         else:
             obj_in = ICatchmentAreaCar(**obj_in)
 
-        # Fetch routing network (processed segments) and load into memory
-        if self.routing_network is None:
-            self.routing_network, _ = await StreetNetworkUtil(self.db_connection).fetch(
-                edge_layer_id=settings.BASE_STREET_NETWORK,
-                node_layer_id=None,
-                region_geofence_table=settings.NETWORK_REGION_TABLE,
-            )
-        routing_network = self.routing_network
+        routing_network = await self.get_routing_network()
 
         total_start = time.time()
 
@@ -610,25 +637,17 @@ class CRUDCatchmentArea:
         sub_routing_network = None
         origin_connector_ids = None
         try:
-            # Create input table for catchment area origin points
-            input_table, num_points = await self.create_input_table(obj_in)
-
             # Read & process routing network to extract relevant sub-network
             (
                 sub_routing_network,
-                network_modifications_table,
                 origin_connector_ids,
                 origin_point_h3_10,
                 _,
             ) = await self.read_network(
                 routing_network,
                 obj_in,
-                input_table,
-                num_points,
+                compare_to_base=obj_in.compare_to_base,
             )
-
-            # Delete input table for catchment area origin points
-            await self.drop_temp_tables(input_table, network_modifications_table)
         except Exception as e:
             self.redis.set(str(obj_in.layer_id), ProcessingStatus.failure.value)
             await self.db_connection.rollback()
@@ -645,6 +664,9 @@ class CRUDCatchmentArea:
         catchment_area_grid = None
         catchment_area_network = None
         catchment_area_shapes = None
+        # Results of the base network, if the scenario is compared to it
+        catchment_area_base_grid = None
+        catchment_area_base_shapes = None
         try:
             is_travel_time_catchment_area = type(obj_in.travel_cost) in [
                 CatchmentAreaTravelTimeCostActiveMobility,
@@ -659,6 +681,9 @@ class CRUDCatchmentArea:
             else:
                 speed = None
 
+            # Unit costs of active mobility are converted to seconds by the requested speed
+            cost_factor = 1.0 / speed if speed is not None else 1.0
+
             if type(obj_in) is ICatchmentAreaActiveMobility:
                 zoom = 12
             else:
@@ -666,7 +691,11 @@ class CRUDCatchmentArea:
 
             catchment_area_grid_index = None
             if obj_in.catchment_area_type != "rectangular_grid":
-                catchment_area_grid, catchment_area_network = compute_isochrone(
+                (
+                    catchment_area_grid,
+                    catchment_area_network,
+                    catchment_area_base_grid,
+                ) = compute_isochrone(
                     edge_network_input=sub_routing_network,
                     start_vertices=origin_connector_ids,
                     travel_time=(
@@ -677,18 +706,19 @@ class CRUDCatchmentArea:
                     speed=speed,
                     zoom=zoom,
                     is_distance_based=(not is_travel_time_catchment_area),
+                    cost_factor=cost_factor,
                 )
             else:
                 (
+                    h3_cells,
                     catchment_area_grid_index,
                     h3_centroid_x,
                     h3_centroid_y,
-                ) = await self.get_h3_10_grid(
-                    self.db_connection,
+                ) = self.get_h3_10_grid(
                     obj_in=obj_in,
                     origin_h3_10=origin_point_h3_10,
                 )
-                catchment_area_grid = compute_isochrone_h3(
+                catchment_area_grid, catchment_area_base_grid = compute_isochrone_h3(
                     edge_network_input=sub_routing_network,
                     start_vertices=origin_connector_ids,
                     travel_time=(
@@ -701,6 +731,12 @@ class CRUDCatchmentArea:
                     centroid_y=h3_centroid_y,
                     zoom=zoom,
                     is_distance_based=(not is_travel_time_catchment_area),
+                    cost_factor=cost_factor,
+                    grid_cells=(
+                        h3_cells
+                        if settings.CATCHMENT_AREA_H3_GRID_AGGREGATION
+                        else None
+                    ),
                 )
             print("Computed catchment area grid & network.")
 
@@ -715,6 +751,17 @@ class CRUDCatchmentArea:
                     percentile=5,
                     steps=obj_in.travel_cost.steps,
                 )
+                if catchment_area_base_grid is not None:
+                    catchment_area_base_shapes = generate_jsolines(
+                        grid=catchment_area_base_grid,
+                        travel_time=(
+                            obj_in.travel_cost.max_traveltime
+                            if is_travel_time_catchment_area
+                            else obj_in.travel_cost.max_distance
+                        ),
+                        percentile=5,
+                        steps=obj_in.travel_cost.steps,
+                    )
                 print("Computed catchment area shapes.")
         except Exception as e:
             self.redis.set(str(obj_in.layer_id), ProcessingStatus.failure.value)
@@ -733,6 +780,8 @@ class CRUDCatchmentArea:
                 catchment_area_network,
                 catchment_area_grid_index,
                 catchment_area_grid,
+                base_shapes=catchment_area_base_shapes,
+                base_grid=catchment_area_base_grid,
             )
         except Exception as e:
             self.redis.set(str(obj_in.layer_id), ProcessingStatus.failure.value)
@@ -7,23 +7,6 @@ from pydantic import BaseModel, Field, field_validator, model_validator
 from routing.core.config import settings
 from typing_extensions import Self
 
-SEGMENT_DATA_SCHEMA = {
-    "id": pl.Int64,
-    "length_m": pl.Float64,
-    "length_3857": pl.Float64,
-    "class_": pl.Utf8,
-    "impedance_slope": pl.Float64,
-    "impedance_slope_reverse": pl.Float64,
-    "impedance_surface": pl.Float32,
-    "coordinates_3857": pl.Utf8,
-    "maxspeed_forward": pl.Int16,
-    "maxspeed_backward": pl.Int16,
-    "source": pl.Int64,
-    "target": pl.Int64,
-    "h3_3": pl.Int32,
-    "h3_6": pl.Int32,
-}
-
 CONNECTOR_DATA_SCHEMA = {
     "id": pl.Int64,
     "h3_3": pl.Int32,
@@ -83,6 +66,39 @@ VALID_CAR_CLASSES = [
     "track",
 ]
 
+# Segment classes known to routing, segments of any other class are stored as "other"
+SEGMENT_CLASSES = list(
+    dict.fromkeys(
+        VALID_WALKING_CLASSES + VALID_BICYCLE_CLASSES + VALID_CAR_CLASSES + ["other"]
+    )
+)
+
+# Compact in-memory schema of street network segments, the web mercator length is
+# derived from the coordinates and the H3_3 cell is implied by the cell a segment is stored in
+SEGMENT_DATA_SCHEMA: dict[str, pl.DataType] = {
+    "id": pl.Int64(),
+    "length_m": pl.Float64(),
+    "class_": pl.Enum(SEGMENT_CLASSES),
+    "impedance_slope": pl.Float32(),
+    "impedance_slope_reverse": pl.Float32(),
+    "impedance_surface": pl.Float32(),
+    "coordinates_3857": pl.List(pl.List(pl.Float64())),
+    "maxspeed_forward": pl.Int16(),
+    "maxspeed_backward": pl.Int16(),
+    "source": pl.Int64(),
+    "target": pl.Int64(),
+    "h3_6": pl.Int32(),
+}
+
+# Schema of raw segment data read from the database, with coordinates as JSON text
+SEGMENT_TEXT_SCHEMA: dict[str, pl.DataType] = {
+    **SEGMENT_DATA_SCHEMA,
+    "length_3857": pl.Float64(),
+    "class_": pl.Utf8(),
+    "coordinates_3857": pl.Utf8(),
+    "h3_3": pl.Int32(),
+}
+
 
 class CatchmentAreaType(str, Enum):
     """Catchment area type schema."""
@@ -299,6 +315,11 @@ class ICatchmentAreaActiveMobility(BaseModel):
         title="Polygon Difference",
         description="If true, the polygons returned will be the geometrical difference of two following calculations.",
     )
+    compare_to_base: bool = Field(
+        False,
+        title="Compare to Base",
+        description="If true, the catchment area of the base network is computed alongside the scenario and the gained & lost areas or travel time differences are saved.",
+    )
     result_table: str = Field(
         ...,
         title="Result Table",
@@ -316,11 +337,17 @@ class ICatchmentAreaActiveMobility(BaseModel):
         street_network = self.street_network
         polygon_difference = self.polygon_difference
         catchment_area_type = self.catchment_area_type
+        compare_to_base = self.compare_to_base
         # Ensure street network is specified if a scenario ID is provided
         if scenario_id is not None and street_network is None:
             raise ValueError(
                 "The street network must be set if a scenario ID is provided."
             )
+        # Ensure a scenario is applied if the catchment area is compared to the base network
+        if compare_to_base and scenario_id is None:
+            raise ValueError(
+                "The scenario ID must be set if the catchment area is compared to the base network."
+            )
         # Check that polygon difference exists if catchment area type is polygon
         if (
             catchment_area_type == CatchmentAreaType.polygon.value
@@ -381,6 +408,11 @@ class ICatchmentAreaCar(BaseModel):
         title="Polygon Difference",
         description="If true, the polygons returned will be the geometrical difference of two following calculations.",
     )
+    compare_to_base: bool = Field(
+        False,
+        title="Compare to Base",
+        description="If true, the catchment area of the base network is computed alongside the scenario and the gained & lost areas or travel time differences are saved.",
+    )
     result_table: str = Field(
         ...,
         title="Result Table",
@@ -398,11 +430,17 @@ class ICatchmentAreaCar(BaseModel):
         street_network = self.street_network
         polygon_difference = self.polygon_difference
         catchment_area_type = self.catchment_area_type
+        compare_to_base = self.compare_to_base
         # Ensure street network is specified if a scenario ID is provided
         if scenario_id is not None and street_network is None:
             raise ValueError(
                 "The street network must be set if a scenario ID is provided."
             )
+        # Ensure a scenario is applied if the catchment area is compared to the base network
+        if compare_to_base and scenario_id is None:
+            raise ValueError(
+                "The scenario ID must be set if the catchment area is compared to the base network."
+            )
         # Check that polygon difference exists if catchment area type is polygon
         if (
             catchment_area_type == CatchmentAreaType.polygon.value
@@ -1,5 +1,4 @@
 import json
-import math
 import os
 from typing import Annotated, Any, Dict, TypedDict
 
@@ -7,48 +6,37 @@ import numpy as np
 import numpy.typing as npt
 from numba import njit
 
+from routing.core import coordinate_transform
+
+TRAVEL_TIME_PERCENTILES = [5, 25, 50, 75, 95]
+
 
 class PixelCoordinates(TypedDict):
     x: float
     y: float
 
 
-@njit(cache=True)  # type: ignore
-def z_scale(z: int) -> int:
-    """
-    2^z represents the tile number. Scale that by the number of pixels in each tile.
-    """
-    _2z: int = 2**z
-    pixels_per_tile = 256
-    return _2z * pixels_per_tile
-
-
 def longitude_to_pixel(longitude: float, zoom: int) -> float:
     """
     Convert longitude to pixel x coordinate
     """
-    z_s: int = z_scale(zoom)
-    return ((longitude + 180) / 360) * z_s
+    return float(coordinate_transform.longitude_to_pixel_x(longitude, zoom))
 
 
 def latitude_to_pixel(latitude: float, zoom: int) -> float:
-    lat_rad = (latitude * math.pi) / 180
-    z_s: int = z_scale(zoom)
-    return (
-        (1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2
-    ) * z_s
+    return float(coordinate_transform.latitude_to_pixel_y(latitude, zoom))
 
 
 @njit(cache=True)  # type: ignore
 def web_mercator_x_to_pixel_x(x: float, zoom: int) -> float:
-    z_s: int = z_scale(zoom)
-    return (x + (40075016.68557849 / 2.0)) / (40075016.68557849 / (z_s))
+    pixel_x: float = coordinate_transform.web_mercator_x_to_pixel_x(x, zoom)
+    return pixel_x
 
 
 @njit(cache=True)  # type: ignore
 def web_mercator_y_to_pixel_y(y: float, zoom: int) -> float:
-    z_s: int = z_scale(zoom)
-    return (y - (40075016.68557849 / 2.0)) / (40075016.68557849 / (-1 * z_s))
+    pixel_y: float = coordinate_transform.web_mercator_y_to_pixel_y(y, zoom)
+    return pixel_y
 
 
 def coordinate_to_pixel(
@@ -82,6 +70,21 @@ def compute_r5_surface(
     """
     Compute single value surface from the grid
     """
+    surfaces = compute_r5_surfaces(grid, [percentile])
+    if surfaces is None:
+        return None
+
+    surface: npt.NDArray[Any] = surfaces[0]
+    return surface
+
+
+def compute_r5_surfaces(
+    grid: Dict[str, npt.NDArray[Any]], percentiles: list[int]
+) -> npt.NDArray[Any] | None:
+    """
+    Compute one single value surface per percentile from the grid, all surfaces
+    are converted in one pass and returned as rows of a 2D array
+    """
     if (
         grid["data"] is None
         or grid["width"] is None
@@ -89,17 +92,16 @@ def compute_r5_surface(
         or grid["depth"] is None
     ):
         return None
-    travel_time_percentiles = [5, 25, 50, 75, 95]
-    percentile_index = travel_time_percentiles.index(percentile)
+    percentile_indices = [
+        TRAVEL_TIME_PERCENTILES.index(percentile) for percentile in percentiles
+    ]
 
+    grid_percentiles = np.reshape(grid["data"], (grid["depth"], -1))
     if grid["depth"] == 1:
-        # if only one percentile is requested, return the grid as is
-        surface = grid["data"]
-    else:
-        grid_percentiles = np.reshape(grid["data"], (grid["depth"], -1))
-        surface = grid_percentiles[percentile_index]
+        # if only one percentile is available, use it for all requested percentiles
+        percentile_indices = [0] * len(percentiles)
 
-    return surface.astype(np.uint16)
+    return grid_percentiles[percentile_indices].astype(np.uint16, copy=False)
 
 
 @njit(cache=True)  # type: ignore
@@ -130,8 +132,8 @@ def pixel_x_to_web_mercator_x(x: float, zoom: int) -> float:
     """
     Convert pixel x coordinate to web mercator x coordinate
     """
-    z_s: int = z_scale(zoom)
-    return x * (40075016.68557849 / (z_s)) - (40075016.68557849 / 2.0)
+    x_3857: float = coordinate_transform.pixel_x_to_web_mercator_x(x, zoom)
+    return x_3857
 
 
 @njit(cache=True)  # type: ignore
@@ -139,8 +141,8 @@ def pixel_y_to_web_mercator_y(y: float, zoom: int) -> float:
     """
     Convert pixel y coordinate to web mercator y coordinate
     """
-    z_s: int = z_scale(zoom)
-    return y * (40075016.68557849 / (-1 * z_s)) + (40075016.68557849 / 2.0)
+    y_3857: float = coordinate_transform.pixel_y_to_web_mercator_y(y, zoom)
+    return y_3857
 
 
 @njit(cache=True)  # type: ignore
@@ -148,8 +150,8 @@ def pixel_to_longitude(pixel_x: float, zoom: int) -> float:
     """
     Convert pixel x coordinate to longitude
     """
-    z_s: int = z_scale(zoom)
-    return (pixel_x / z_s) * 360 - 180
+    longitude: float = coordinate_transform.pixel_x_to_longitude(pixel_x, zoom)
+    return longitude
 
 
 @njit(cache=True)  # type: ignore
@@ -157,8 +159,8 @@ def pixel_to_latitude(pixel_y: float, zoom: int) -> float:
     """
     Convert pixel y coordinate to latitude
     """
-    lat_rad = math.atan(math.sinh(math.pi * (1 - (2 * pixel_y) / z_scale(zoom))))
-    return lat_rad * 180 / math.pi
+    latitude: float = coordinate_transform.pixel_y_to_latitude(pixel_y, zoom)
+    return latitude
 
 
 def decode_r5_grid(grid_data_buffer: bytes) -> Any: